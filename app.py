@@ -1,191 +1,574 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import uuid
-import threading
-from threading import Lock
 import time
+import json
 import os
 import logging
 import asyncio
+import glob
+import shutil
+import threading
 from utility.script.script_generator import generate_script
-from utility.audio.audio_generator import generate_audio
-from utility.captions.timed_captions_generator import generate_timed_captions
-from utility.video.background_video_generator import generate_video_url
-from utility.render.render_engine import get_output_media
-from utility.video.video_search_query_generator import getVideoSearchQueriesTimed, merge_empty_intervals
+from utility.audio.audio_generator import generate_audio, generate_audio_with_word_boundaries
+from utility.captions.timed_captions_generator import generate_timed_captions, generate_timed_captions_from_word_boundaries
+from utility.captions.model_registry import warm_up_models
+from utility.video.background_video_generator import generate_video_url, prefetch_segment_searches
+from utility.render.render_engine import get_output_media, RENDER_BACKENDS, RENDER_BACKEND
+from utility.render.profiles import RENDER_PROFILES, DEFAULT_RENDER_PROFILE, get_render_profile
+from utility.video.video_search_query_generator import (getVideoSearchQueriesTimed, merge_empty_intervals,
+                                                        validate_segment, structured_output_stats)
+from utility.tasks.scheduler import QueueFullError, MAX_WORKERS
+from utility.tasks.pipeline import StagePipeline
+from utility.tasks.task_store import create_task_store, TASK_TTL_SECONDS, FINISHED_STATUSES
+from utility.tasks.progress_bus import ProgressBus
+from utility.tasks.batch import BatchFeeder, MAX_BATCH_SIZE
+from utility.tasks.cpu_budget import cpu_budget
+from utility.tasks.cancellation import CancellationToken, TaskCancelled
+from utility.llm_client import get_llm_cache, ollama_health
+from utility.warmup import warm_up_imports, warmup_status
+from utility.render.ffmpeg_backend import ffmpeg_binary
+from utility.video.background_video_generator import get_search_cache
+from utility.render.media_cache import get_media_cache
+from utility.render.caption_renderer import caption_renderer
+from utility.metrics import registry as metrics_registry
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-# Global variables to store task status and results
-tasks = {}
-task_lock = Lock()  # Thread-safe lock for tasks dictionary
-active_threads = {}  # Dictionary to track running threads
+# Task status and results, persisted according to TASK_STORE
+task_store = create_task_store()
+
+# Pushes every task change to /events subscribers, so clients stop polling /status
+progress_bus = ProgressBus()
+# Task fields sent to progress subscribers
+PROGRESS_FIELDS = ('status', 'topic', 'progress', 'message', 'stage', 'progress_detail',
+                   'result', 'error', 'error_type', 'created_at', 'updated_at')
+# Minimum seconds between two fine-grained progress updates of one stage
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "0.5"))
+# Comment lines sent on idle event streams so proxies keep them open
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+LONG_POLL_MAX_SECONDS = 60
+# Share of the render stage's progress range taken by each render phase
+RENDER_PHASES = {'download': (0.0, 0.25), 'encode': (0.25, 0.95)}
+
+def publish_task_change(task_id, fields):
+    changed = {name: fields[name] for name in PROGRESS_FIELDS if name in fields}
+    if changed:
+        progress_bus.publish(task_id, **changed)
+
+task_store.add_listener(publish_task_change)
+
+STAGE_SECONDS = metrics_registry.histogram(
+    'video_stage_seconds', 'Time spent running each pipeline stage of a task', ('stage', 'outcome'))
+STAGE_WAIT_SECONDS = metrics_registry.histogram(
+    'video_stage_wait_seconds', 'Time a task waited before each pipeline stage started', ('stage',))
+TASKS_FINISHED = metrics_registry.counter('video_tasks_finished_total', 'Tasks by final status', ('status',))
+
+def count_finished_task(task_id, fields):
+    if fields.get('status') in FINISHED_STATUSES:
+        TASKS_FINISHED.inc(status=fields['status'])
+
+task_store.add_listener(count_finished_task)
+
+# Where caption timings come from: "tts" uses edge-tts word boundaries, "whisper" transcribes the audio
+CAPTION_SOURCES = ('tts', 'whisper')
+DEFAULT_CAPTION_SOURCE = os.getenv("CAPTION_SOURCE", "tts")
+
+# "pipeline" runs each stage on its own pool so stages of different tasks overlap,
+# "task" runs whole tasks on MAX_WORKERS threads
+EXECUTION_MODE = os.getenv("EXECUTION_MODE", "pipeline")
+# Worker threads per stage: LLM calls are remote, Whisper and rendering are CPU-bound, Pexels is I/O
+STAGE_WORKERS = {
+    'script': int(os.getenv("SCRIPT_WORKERS", "2")),
+    'audio': int(os.getenv("AUDIO_WORKERS", "4")),
+    'captions': int(os.getenv("CAPTION_WORKERS", "1")),
+    'keywords': int(os.getenv("KEYWORD_WORKERS", "2")),
+    'footage': int(os.getenv("FOOTAGE_WORKERS", "4")),
+    'render': int(os.getenv("RENDER_WORKERS", "1")),
+}
+
+# Cancellation tokens of tasks that are queued or running, by task id
+cancel_tokens = {}
 
 # Add this at the beginning of your existing app.py
 
+MAX_TASKS_PAGE_SIZE = 500
+
 @app.route('/tasks', methods=['GET'])
 def list_tasks():
-    with task_lock:
-        simplified_tasks = []
-        for task_id, task_data in tasks.items():
-            simplified_tasks.append({
-                'task_id': task_id,
-                'status': task_data['status'],
-                'topic': task_data['topic'],
-                'progress': task_data.get('progress', 0),
-                'created_at': task_data.get('created_at'),
-                'updated_at': task_data.get('updated_at'),
-                'message': task_data.get('message', '')
-            })
-        return jsonify({'tasks': simplified_tasks})
+    try:
+        limit = int(request.args.get('limit', 50))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    if limit < 1 or offset < 0:
+        return jsonify({'error': 'limit must be at least 1 and offset at least 0'}), 400
+    limit = min(limit, MAX_TASKS_PAGE_SIZE)
+    created_after = request.args.get('created_after', type=float)
+    created_before = request.args.get('created_before', type=float)
+
+    task_page, total = task_store.list(
+        status=request.args.get('status'),
+        created_after=created_after,
+        created_before=created_before,
+        limit=limit,
+        offset=offset
+    )
+    simplified_tasks = []
+    for task_data in task_page:
+        simplified_tasks.append({
+            'task_id': task_data['task_id'],
+            'status': task_data['status'],
+            'topic': task_data['topic'],
+            'progress': task_data.get('progress', 0),
+            'created_at': task_data.get('created_at'),
+            'updated_at': task_data.get('updated_at'),
+            'message': task_data.get('message', '')
+        })
+    return jsonify({'tasks': simplified_tasks, 'total': total, 'limit': limit, 'offset': offset})
 
 @app.route('/tasks/<task_id>/cancel', methods=['POST'])
 def cancel_task(task_id):
-    with task_lock:
-        if task_id not in tasks:
+    if not request_cancellation(task_id):
+        if task_store.get(task_id) is None:
             return jsonify({'error': 'Task not found'}), 404
-        
-        if tasks[task_id]['status'] not in ['queued', 'processing']:
-            return jsonify({'error': 'Task cannot be cancelled in its current state'}), 400
-        
-        # Mark task for cancellation
-        tasks[task_id]['status'] = 'cancelling'
-        tasks[task_id]['message'] = 'Cancellation requested'
-        tasks[task_id]['updated_at'] = time.time()
-        
-        # Try to stop the thread if it's running
-        if task_id in active_threads:
-            thread = active_threads[task_id]
-            # This is a gentle way to signal cancellation
-            # For more forceful termination, consider using multiprocessing instead
-            tasks[task_id]['cancelled'] = True
-        
-        return jsonify({'status': 'cancellation_requested', 'task_id': task_id})
+        return jsonify({'error': 'Task cannot be cancelled in its current state'}), 400
+    return jsonify({'status': 'cancellation_requested', 'task_id': task_id})
+
+def request_cancellation(task_id):
+    """Cancel a queued or running task. Returns False if it is unknown or already finished."""
+    # Mark task for cancellation
+    marked = task_store.transition(
+        task_id, ('queued', 'processing'),
+        status='cancelling',
+        message='Cancellation requested',
+        cancelled=True,
+        updated_at=time.time()
+    )
+    if not marked:
+        return False
+    
+    # Tasks still waiting in the queue or held back by their batch never
+    # start. Running ones are stopped through their token: child processes
+    # are killed, and downloads, encodes, transcription and LLM streams stop
+    # at their next chunk, frame or token
+    ctx = executor.cancel(task_id) or batch_feeder.cancel(task_id)
+    if ctx is not None:
+        cancel_tokens.pop(task_id, None)
+        abandon_task_files(ctx)
+        task_store.update(task_id, status='cancelled', message='Task was cancelled', updated_at=time.time())
+    else:
+        token = cancel_tokens.get(task_id)
+        if token is not None:
+            token.cancel()
+    return True
 
 def update_task_progress(task_id, progress, message=None):
-    with task_lock:
-        if task_id in tasks:
-            tasks[task_id]['progress'] = progress
-            if message:
-                tasks[task_id]['message'] = message
-            tasks[task_id]['updated_at'] = time.time()
-
-def generate_video_async(task_id, topic, language, voice, font_settings):
-    try:
-        SAMPLE_FILE_NAME = f"audio_tts_{task_id}.wav"
-        VIDEO_SERVER = "pexel"
-        
-        # Check for cancellation before each major step
-        def check_cancellation():
-            with task_lock:
-                if tasks.get(task_id, {}).get('cancelled', False):
-                    tasks[task_id]['status'] = 'cancelled'
-                    tasks[task_id]['message'] = 'Task was cancelled'
-                    tasks[task_id]['updated_at'] = time.time()
-                    raise Exception("Task cancelled by user")
-
-        # Initialize task progress
-        with task_lock:
-            tasks[task_id]['status'] = 'processing'
-            tasks[task_id]['progress'] = 0
-            tasks[task_id]['created_at'] = time.time()
-            tasks[task_id]['updated_at'] = time.time()
-            tasks[task_id]['steps'] = [
-                'script_generation',
-                'audio_generation',
-                'caption_generation',
-                'video_search',
-                'video_rendering'
-            ]
-
-        # Step 1: Generate script (10% weight)
-        update_task_progress(task_id, 0, 'Generating script...')
-        check_cancellation()
-        response = generate_script(topic, language)
-        update_task_progress(task_id, 10, 'Script generated')
-        
-        # Step 2: Create audio (20% weight)
-        update_task_progress(task_id, 10, 'Script generated. Creating audio...')
-        check_cancellation()
-        asyncio.run(generate_audio(response, SAMPLE_FILE_NAME, voice))
-        update_task_progress(task_id, 30, 'Audio generated')
-        
-        # Step 3: Create captions (20% weight)
-        update_task_progress(task_id, 30, 'Audio generated. Creating captions...')
-        check_cancellation()
-        timed_captions = generate_timed_captions(SAMPLE_FILE_NAME)
-        update_task_progress(task_id, 50, 'Captions created')
-        
-        # Step 4: Generate video search terms (20% weight)
-        update_task_progress(task_id, 50, 'Captions created. Generating video terms...')
-        check_cancellation()
-        search_terms = getVideoSearchQueriesTimed(response, timed_captions, language)
-        update_task_progress(task_id, 70, 'Video terms generated')
-        
-        # Step 5: Search for background videos (15% weight)
-        update_task_progress(task_id, 70, 'Searching for background videos...')
-        check_cancellation()
-        background_video_urls = generate_video_url(search_terms, VIDEO_SERVER) if search_terms else None
-        background_video_urls = merge_empty_intervals(background_video_urls)
-        update_task_progress(task_id, 85, 'Background videos found')
-        
-        if background_video_urls:
-            # Step 6: Render final video (15% weight)
-            update_task_progress(task_id, 85, 'Rendering final video...')
-            check_cancellation()
-            video_path = get_output_media(
-                audio_file_path=SAMPLE_FILE_NAME,
-                timed_captions=timed_captions,
-                background_video_data=background_video_urls,
-                video_server=VIDEO_SERVER,
-                font_settings=font_settings
-            )
-            
-            with task_lock:
-                tasks[task_id]['status'] = 'completed'
-                tasks[task_id]['progress'] = 100
-                tasks[task_id]['result'] = {'video_path': f'/videos/{video_path}'}
-                tasks[task_id]['message'] = 'Video generation complete'
-                tasks[task_id]['updated_at'] = time.time()
+    fields = {'progress': progress, 'updated_at': time.time()}
+    if message:
+        fields['message'] = message
+    task_store.update(task_id, **fields)
+
+def stage_progress(task_id, progress_before, progress_after):
+    """report(fraction, message=None, **detail) mapping a stage's own progress onto the task's range.
+
+    Updates closer together than PROGRESS_INTERVAL are dropped, except the final one.
+    """
+    last_report = [0.0]
+
+    def report(fraction, message=None, **detail):
+        now = time.time()
+        if fraction < 1 and now - last_report[0] < PROGRESS_INTERVAL:
+            return
+        last_report[0] = now
+        fraction = min(max(fraction, 0.0), 1.0)
+        fields = {
+            'progress': round(progress_before + (progress_after - progress_before) * fraction, 1),
+            'progress_detail': detail or None,
+            'updated_at': now
+        }
+        if message:
+            fields['message'] = message
+        task_store.update(task_id, **fields)
+    return report
+
+def render_progress(report):
+    """get_output_media on_progress callback feeding the render stage's report()"""
+    def on_progress(phase, done, total, **detail):
+        low, high = RENDER_PHASES.get(phase, (0.0, 1.0))
+        fraction = done / total if total else 0.0
+        if phase == 'download':
+            message = f"Downloading background videos ({done:.1f}/{total} clips, {detail.get('bytes', 0) / 1e6:.1f} MB)"
         else:
-            with task_lock:
-                tasks[task_id]['status'] = 'failed'
-                tasks[task_id]['error'] = 'No background video available'
-                tasks[task_id]['updated_at'] = time.time()
-                
-        if os.path.exists(SAMPLE_FILE_NAME):
-            os.remove(SAMPLE_FILE_NAME)
-            
-    except Exception as e:
-        if str(e) == "Task cancelled by user":
+            message = f"Encoding video ({done:.1f}s of {total:.1f}s)"
+        report(low + (high - low) * fraction, message, phase=phase, done=round(done, 2), total=round(total, 2),
+               **detail)
+    return on_progress
+
+def check_cancellation(task_id):
+    task = task_store.get(task_id)
+    if task is not None and task.get('cancelled', False):
+        task_store.update(task_id, status='cancelled', message='Task was cancelled', updated_at=time.time())
+        raise TaskCancelled("Task cancelled by user")
+
+def start_task(ctx):
+    task_store.update(
+        ctx['task_id'],
+        status='processing',
+        progress=0,
+        created_at=time.time(),
+        updated_at=time.time(),
+        steps=[
+            'script_generation',
+            'audio_generation',
+            'caption_generation',
+            'video_search',
+            'video_rendering'
+        ]
+    )
+
+def script_stage(ctx):
+    last_update = [0.0]
+    def on_partial_script(script):
+        # Streaming progress, at most once a second
+        now = time.time()
+        if now - last_update[0] >= 1:
+            last_update[0] = now
+            task_store.update(ctx['task_id'], message=f'Generating script... ({len(script.split())} words)',
+                              updated_at=now)
+
+    ctx['script'] = generate_script(ctx['topic'], ctx['language'], use_cache=ctx.get('use_llm_cache', True),
+                                    on_partial_script=on_partial_script, cancel_token=ctx['cancel_token'])
+
+def audio_stage(ctx):
+    ctx['word_boundaries'] = None
+    if ctx['caption_source'] == 'tts':
+        ctx['word_boundaries'] = asyncio.run(generate_audio_with_word_boundaries(
+            ctx['script'], ctx['audio_file'], ctx['voice'], cancel_token=ctx['cancel_token']))
+    else:
+        asyncio.run(generate_audio(ctx['script'], ctx['audio_file'], ctx['voice'], cancel_token=ctx['cancel_token']))
+
+def captions_stage(ctx):
+    timed_captions = None
+    if ctx['word_boundaries']:
+        timed_captions = generate_timed_captions_from_word_boundaries(ctx['word_boundaries'])
+    if not timed_captions:
+        if ctx['caption_source'] == 'tts':
+            logger.warning(f"Task {ctx['task_id']}: no usable TTS word boundaries, falling back to Whisper")
+        timed_captions = generate_timed_captions(ctx['audio_file'], cancel_token=ctx['cancel_token'])
+    ctx['timed_captions'] = timed_captions
+
+def keywords_stage(ctx):
+    def on_segment(segment):
+        # Search Pexels for early segments while the model is still writing later ones
+        if ctx['video_server'] == 'pexel':
+            prefetch_segment_searches(validate_segment(segment, 0)[1])
+
+    ctx['search_terms'] = getVideoSearchQueriesTimed(
+        ctx['script'], ctx['timed_captions'], ctx['language'], use_cache=ctx.get('use_llm_cache', True),
+        on_segment=on_segment, cancel_token=ctx['cancel_token'])
+
+def footage_stage(ctx):
+    search_terms = ctx['search_terms']
+    footage_width = get_render_profile(ctx['render_profile'])['footage_width']
+    background_video_urls = generate_video_url(
+        search_terms, ctx['video_server'], footage_width=footage_width,
+        cancel_token=ctx['cancel_token']) if search_terms else None
+    ctx['background_video_urls'] = merge_empty_intervals(background_video_urls)
+    if not ctx['background_video_urls']:
+        raise ValueError('No background video available')
+    if ctx['render_profile'] != 'final':
+        # Same videos in final quality, for promoting the draft later; the
+        # searches are answered from the cache filled just above
+        ctx['final_video_urls'] = merge_empty_intervals(generate_video_url(
+            search_terms, ctx['video_server'], footage_width=RENDER_PROFILES['final']['footage_width']))
+
+def render_stage(ctx):
+    task_id = ctx['task_id']
+    is_draft = ctx['render_profile'] != 'final'
+    video_path = get_output_media(
+        audio_file_path=ctx['audio_file'],
+        timed_captions=ctx['timed_captions'],
+        background_video_data=ctx['background_video_urls'],
+        video_server=ctx['video_server'],
+        font_settings=ctx['font_settings'],
+        render_backend=ctx['render_backend'],
+        render_profile=ctx['render_profile'],
+        keep_audio=is_draft,
+        cancel_token=ctx['cancel_token'],
+        on_progress=render_progress(ctx['report_progress'])
+    )
+    fields = {}
+    if is_draft:
+        # Everything a final render needs, so promoting the draft only re-encodes
+        fields['artifacts'] = {
+            'script': ctx['script'],
+            'audio_file': ctx['audio_file'],
+            'timed_captions': ctx['timed_captions'],
+            'background_video_urls': ctx['final_video_urls']
+        }
+    task_store.update(
+        task_id,
+        status='completed',
+        progress=100,
+        result={'video_path': f'/videos/{video_path}'},
+        message='Video generation complete',
+        updated_at=time.time(),
+        **fields
+    )
+    cancel_tokens.pop(task_id, None)
+    if not is_draft:
+        cleanup_task_files(ctx)
+
+# (name, function, progress before, progress after, start message, done message)
+VIDEO_STAGES = [
+    ('script', script_stage, 0, 10, 'Generating script...', 'Script generated'),
+    ('audio', audio_stage, 10, 30, 'Script generated. Creating audio...', 'Audio generated'),
+    ('captions', captions_stage, 30, 50, 'Audio generated. Creating captions...', 'Captions created'),
+    ('keywords', keywords_stage, 50, 70, 'Captions created. Generating video terms...', 'Video terms generated'),
+    ('footage', footage_stage, 70, 85, 'Searching for background videos...', 'Background videos found'),
+    ('render', render_stage, 85, 100, 'Rendering final video...', 'Video generation complete'),
+]
+
+def run_stage(ctx, stage):
+    name, func, progress_before, progress_after, start_message, done_message = stage
+    task_id = ctx['task_id']
+    ctx['cancel_token'].raise_if_cancelled()
+    check_cancellation(task_id)
+    if not ctx.get('started'):
+        start_task(ctx)
+        ctx['started'] = True
+    started = time.time()
+    waited = max(0.0, started - ctx.get('stage_ready_at', started))
+    STAGE_WAIT_SECONDS.observe(waited, stage=name)
+    task_store.update(task_id, stage=name, progress_detail=None)
+    ctx['report_progress'] = stage_progress(task_id, progress_before, progress_after)
+    update_task_progress(task_id, progress_before, start_message)
+    outcome = 'error'
+    try:
+        func(ctx)
+        outcome = 'ok'
+    finally:
+        elapsed = time.time() - started
+        if outcome != 'ok' and ctx['cancel_token'].cancelled:
+            outcome = 'cancelled'
+        STAGE_SECONDS.observe(elapsed, stage=name, outcome=outcome)
+        ctx['stage_ready_at'] = time.time()
+        # Per-task breakdown for /status: queue wait before the stage and time spent in it
+        ctx.setdefault('stage_timings', {})[name] = {'waited': round(waited, 3), 'seconds': round(elapsed, 3)}
+        task_store.update(task_id, stage_timings=ctx['stage_timings'])
+    update_task_progress(task_id, progress_after, done_message)
+
+# Seconds between sweeps of narration kept for drafts
+AUDIO_SWEEP_INTERVAL = float(os.getenv("AUDIO_SWEEP_INTERVAL", "3600"))
+
+def sweep_stale_audio(max_age=TASK_TTL_SECONDS):
+    """Remove narration kept for drafts that were never promoted"""
+    cutoff = time.time() - max_age
+    for path in glob.glob("audio_tts_*.wav"):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
             pass
+
+def start_audio_sweeper(interval=AUDIO_SWEEP_INTERVAL):
+    """Sweep stale audio now and every interval seconds, whichever way the app is served"""
+    def sweep_loop():
+        while True:
+            try:
+                sweep_stale_audio()
+            except Exception:
+                logger.warning("Stale audio sweep failed", exc_info=True)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=sweep_loop, name="audio-sweeper", daemon=True)
+    thread.start()
+    return thread
+
+def cleanup_task_files(ctx):
+    if os.path.exists(ctx['audio_file']):
+        os.remove(ctx['audio_file'])
+
+def abandon_task_files(ctx):
+    """Clean up after a task that failed or was cancelled.
+
+    A promoted task renders from its draft's audio, so that is kept and the
+    draft can be promoted again.
+    """
+    if ctx.get('promoted_from'):
+        task_store.update(ctx['promoted_from'], promoted_to=None, updated_at=time.time())
+    else:
+        cleanup_task_files(ctx)
+
+def handle_task_error(ctx, e):
+    task_id = ctx['task_id']
+    cancel_tokens.pop(task_id, None)
+    abandon_task_files(ctx)
+    # Library wrappers may re-raise a cancellation as a generic error, so trust the token
+    if isinstance(e, TaskCancelled) or ctx['cancel_token'].cancelled:
+        task_store.update(task_id, status='cancelled', message='Task was cancelled', updated_at=time.time())
+        return
+    error_msg = str(e)
+    error_type = type(e).__name__
+    logger.error(f"Task {task_id} failed: {error_msg}", exc_info=e)
+    task_store.update(
+        task_id,
+        status='failed',
+        error=error_msg,
+        error_type=error_type,
+        updated_at=time.time()
+    )
+
+def generate_video_async(ctx):
+    """Run every stage of one task back to back on the calling thread.
+
+    A ctx with 'start_stage' skips the stages before it; their results are already in ctx.
+    """
+    names = [stage[0] for stage in VIDEO_STAGES]
+    first = names.index(ctx['start_stage']) if ctx.get('start_stage') in names else 0
+    for stage in VIDEO_STAGES[first:]:
+        run_stage(ctx, stage)
+
+def build_executor():
+    if EXECUTION_MODE == 'task':
+        # Whole tasks on MAX_WORKERS threads, the pre-pipeline behaviour
+        stages = [('task', generate_video_async, MAX_WORKERS)]
+    else:
+        stages = [(stage[0], lambda ctx, stage=stage: run_stage(ctx, stage), STAGE_WORKERS[stage[0]])
+                  for stage in VIDEO_STAGES]
+    return StagePipeline(stages, on_error=handle_task_error)
+
+executor = build_executor()
+# Drafts' narration is swept at start-up and then periodically, also under gunicorn or flask run
+start_audio_sweeper()
+# Tasks left running by the previous process never finish; fail them before this one takes new tasks
+interrupted = task_store.fail_interrupted()
+if interrupted:
+    logger.warning(f"Marked {interrupted} tasks interrupted by the last shutdown as failed")
+# Heavy imports load in the background, so /ready reports them done under any server
+warm_up_imports()
+# Encoder presets step faster as tasks pile up
+cpu_budget.bind_queue_depth(executor.queue_depth)
+
+@app.route('/stages', methods=['GET'])
+def list_stages():
+    return jsonify({'mode': EXECUTION_MODE, 'stages': executor.stats(), 'cpu': cpu_budget.stats()})
+
+@app.route('/llm/stats', methods=['GET'])
+def llm_stats():
+    return jsonify({'cache': get_llm_cache().stats(), 'keyword_output': structured_output_stats()})
+
+def collect_cache_stats():
+    return {
+        'llm': get_llm_cache().stats(),
+        'pexels_search': get_search_cache().stats(),
+        'media': get_media_cache().stats(),
+        'captions': caption_renderer.stats()
+    }
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(collect_cache_stats())
+
+def cache_lookups(kind):
+    """{(cache,): hits or misses} for the cache metrics; two-tier caches count memory and disk hits"""
+    counts = {}
+    for name, stats in collect_cache_stats().items():
+        if kind == 'hits':
+            counts[(name,)] = stats.get('hits', stats.get('memory_hits', 0) + stats.get('disk_hits', 0))
         else:
-            error_msg = str(e)
-            error_type = type(e).__name__
-            logger.error(f"Task {task_id} failed: {error_msg}", exc_info=True)
-            with task_lock:
-                tasks[task_id]['status'] = 'failed'
-                tasks[task_id]['error'] = error_msg
-                tasks[task_id]['error_type'] = error_type
-                tasks[task_id]['updated_at'] = time.time()
-    finally:
-        # Clean up the thread reference
-        with task_lock:
-            if task_id in active_threads:
-                del active_threads[task_id]
+            counts[(name,)] = stats['misses']
+    return counts
+
+metrics_registry.callback('cache_hits_total', 'Cache lookups answered from the cache',
+                          lambda: cache_lookups('hits'), ('cache',), type='counter')
+metrics_registry.callback('cache_misses_total', 'Cache lookups that had to fetch',
+                          lambda: cache_lookups('misses'), ('cache',), type='counter')
+metrics_registry.callback('cache_hit_ratio', 'Share of cache lookups answered from the cache',
+                          lambda: {(name,): stats['hit_rate'] for name, stats in collect_cache_stats().items()},
+                          ('cache',))
+metrics_registry.callback('video_queue_depth', 'Tasks waiting for each stage',
+                          lambda: {(s['stage'],): s['queued'] for s in executor.stats()}, ('stage',))
+metrics_registry.callback('video_active_workers', 'Workers running a task in each stage',
+                          lambda: {(s['stage'],): s['active'] for s in executor.stats()}, ('stage',))
+metrics_registry.callback('video_stage_workers', 'Worker threads configured for each stage',
+                          lambda: {(s['stage'],): s['workers'] for s in executor.stats()}, ('stage',))
+metrics_registry.callback('cpu_threads_allocated', 'Encoder and transcription threads handed out',
+                          lambda: cpu_budget.stats()['threads_allocated'])
+metrics_registry.callback('cpu_cores', 'Cores shared by CPU-bound work', lambda: cpu_budget.stats()['cores'])
+metrics_registry.callback('llm_keyword_outputs_total', 'Keyword answers by how they were parsed, and answers asked again',
+                          lambda: {(result,): count for result, count in structured_output_stats().items()
+                                   if result != 'responses'},
+                          ('result',), type='counter')
+
+# Set to 1 to report not ready until the background import warm-up has finished
+READY_AFTER_WARMUP = os.getenv("READY_AFTER_WARMUP", "0") == "1"
+
+def check_ffmpeg():
+    try:
+        binary = ffmpeg_binary()
+    except Exception as e:
+        return {'ok': False, 'error': str(e)}
+    return {'ok': bool(shutil.which(binary) or os.path.isfile(binary)), 'binary': binary}
+
+def check_task_store():
+    try:
+        task_store.list(limit=1)
+        return {'ok': True}
+    except Exception as e:
+        return {'ok': False, 'error': str(e)}
+
+@app.route('/ready', methods=['GET'])
+def readiness():
+    """Readiness probe: 200 when Ollama, ffmpeg and the task store are usable, 503 with the failing checks otherwise.
+
+    Nothing is checked at import, so the process starts even while a dependency is briefly down.
+    """
+    ollama_ok, ollama_detail = ollama_health()
+    warmup = warmup_status()
+    checks = {
+        'ollama': dict(ollama_detail, ok=ollama_ok),
+        'ffmpeg': check_ffmpeg(),
+        'task_store': check_task_store(),
+        'warmup': dict(warmup, ok=warmup['done'] or not READY_AFTER_WARMUP)
+    }
+    ready = all(check['ok'] for check in checks.values())
+    return jsonify({'ready': ready, 'checks': checks}), 200 if ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of stage latencies, external calls, caches and queues"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+def parse_task_request(data):
+    """Settings of one task from a /generate body; raises ValueError with a message for the client"""
+    if not data or not data.get('topic'):
+        raise ValueError('Topic is required')
 
-@app.route('/generate', methods=['POST'])
-def generate_video():
-    data = request.json
-    if not data or 'topic' not in data:
-        return jsonify({'error': 'Topic is required'}), 400
-    
     # Language and voice settings
     language = data.get('language', 'en')
     voice = data.get('voice', 'en-AU-WilliamNeural' if language == 'en' else 'ar-SA-HamedNeural')
-    
+    caption_source = data.get('caption_source', DEFAULT_CAPTION_SOURCE)
+    if caption_source not in CAPTION_SOURCES:
+        raise ValueError(f"caption_source must be one of {list(CAPTION_SOURCES)}")
+    render_backend = data.get('render_backend', RENDER_BACKEND)
+    if render_backend not in RENDER_BACKENDS:
+        raise ValueError(f"render_backend must be one of {list(RENDER_BACKENDS)}")
+    render_profile = data.get('render_profile', DEFAULT_RENDER_PROFILE)
+    if render_profile not in RENDER_PROFILES:
+        raise ValueError(f"render_profile must be one of {list(RENDER_PROFILES)}")
+    try:
+        priority = int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        raise ValueError('priority must be an integer')
+    # False asks the model again instead of reusing answers to identical prompts
+    use_llm_cache = data.get('use_llm_cache', True)
+    if not isinstance(use_llm_cache, bool):
+        raise ValueError('use_llm_cache must be a boolean')
+
     # Font settings with defaults
     font_settings = {
         'size': data.get('font_size', 100) * 0.75,
@@ -194,88 +577,444 @@ def generate_video():
         'stroke_width': data.get('font_stroke_width', 3),
         'family': data.get('font_family', 'Arial' if language == 'en' else 'Arial Unicode MS')
     }
+    return {
+        'topic': data['topic'],
+        'language': language,
+        'voice': voice,
+        'font_settings': font_settings,
+        'caption_source': caption_source,
+        'render_backend': render_backend,
+        'render_profile': render_profile,
+        'use_llm_cache': use_llm_cache,
+        'priority': priority
+    }
 
+def create_task(settings, batch_id=None):
+    """Store a queued task for parsed settings and return its context"""
     task_id = str(uuid.uuid4())
-    with task_lock:
-        tasks[task_id] = {
-            'status': 'queued',
-            'topic': data['topic'],
-            'language': language,
-            'settings': {
-                'voice': voice,
-                'font': font_settings
-            },
-            'message': 'Waiting to start processing...',
-            'progress': 0,
-            'created_at': time.time(),
-            'updated_at': time.time(),
-            'cancelled': False
-        }
-    
-    thread = threading.Thread(
-        target=generate_video_async, 
-        args=(task_id, data['topic'], language, voice, font_settings)
-    )
-    
-    with task_lock:
-        active_threads[task_id] = thread
-    
-    thread.start()
+    task = {
+        'status': 'queued',
+        'topic': settings['topic'],
+        'language': settings['language'],
+        'settings': {
+            'voice': settings['voice'],
+            'font': settings['font_settings'],
+            'caption_source': settings['caption_source'],
+            'render_backend': settings['render_backend'],
+            'render_profile': settings['render_profile'],
+            'use_llm_cache': settings['use_llm_cache']
+        },
+        'message': 'Waiting to start processing...',
+        'progress': 0,
+        'priority': settings['priority'],
+        'created_at': time.time(),
+        'updated_at': time.time(),
+        'cancelled': False
+    }
+    if batch_id:
+        task['batch_id'] = batch_id
+    task_store.create(task_id, task)
+
+    ctx = {name: settings[name] for name in ('topic', 'language', 'voice', 'font_settings', 'caption_source',
+                                              'render_backend', 'render_profile', 'use_llm_cache')}
+    ctx.update(task_id=task_id, audio_file=f"audio_tts_{task_id}.wav", video_server="pexel")
+    return ctx
+
+@app.route('/generate', methods=['POST'])
+def generate_video():
+    try:
+        settings = parse_task_request(request.json)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return submit_task(create_task(settings), settings['priority'])
+
+def enqueue_task(ctx, priority, start_stage=None):
+    """Hand a task to the pipeline; raises QueueFullError when admission is refused"""
+    task_id = ctx['task_id']
+    ctx['cancel_token'] = cancel_tokens[task_id] = CancellationToken()
+    ctx['stage_ready_at'] = time.time()
+    try:
+        executor.submit(task_id, ctx, priority=priority, start_stage=start_stage)
+    except QueueFullError:
+        cancel_tokens.pop(task_id, None)
+        raise
+
+def submit_task(ctx, priority, start_stage=None):
+    task_id = ctx['task_id']
+    try:
+        enqueue_task(ctx, priority, start_stage)
+    except QueueFullError as e:
+        task_store.delete(task_id)
+        progress_bus.forget(task_id)
+        response = jsonify({'error': 'Server is busy, please retry later', 'retry_after': e.retry_after})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
     
     return jsonify({
         'task_id': task_id,
         'status_url': f'/status/{task_id}',
+        'events_url': f'/events/{task_id}',
         'cancel_url': f'/tasks/{task_id}/cancel'
     }), 202
 
+def release_batch_task(ctx, priority):
+    """BatchFeeder callback: start a batch task unless it was cancelled while held back"""
+    task_id = ctx['task_id']
+    task = task_store.get(task_id)
+    if task is None:
+        batch_feeder.task_finished(task_id)
+        return
+    if task['status'] != 'queued':
+        # Cancelled between leaving the feeder and reaching the pipeline
+        if not task_store.transition(task_id, ('cancelling',), status='cancelled',
+                                     message='Task was cancelled', updated_at=time.time()):
+            batch_feeder.task_finished(task_id)
+        return
+    try:
+        enqueue_task(ctx, priority)
+    except QueueFullError:
+        raise
+    except Exception as e:
+        handle_task_error(ctx, e)
+
+# Batch tasks are held here and released into the pipeline a few at a time
+batch_feeder = BatchFeeder(release_batch_task)
+
+def release_finished_task(task_id, fields):
+    if fields.get('status') in FINISHED_STATUSES:
+        batch_feeder.task_finished(task_id)
+
+task_store.add_listener(release_finished_task)
+
+metrics_registry.callback('batch_tasks_pending', 'Batch tasks held back until a batch slot frees up',
+                          lambda: batch_feeder.stats()['pending'])
+metrics_registry.callback('batch_tasks_in_flight', 'Batch tasks released into the pipeline and not finished',
+                          lambda: batch_feeder.stats()['in_flight'])
+
+@app.route('/generate/batch', methods=['POST'])
+def generate_batch():
+    """Accept many topics at once; settings at the top level apply to every task unless a task overrides them.
+
+    Body: {"topics": ["...", ...]} or {"tasks": [{"topic": "...", ...}, ...]}, plus shared settings.
+    Tasks run through the same pipeline as single requests, so identical
+    Pexels searches, footage downloads, LLM prompts and the Whisper model are
+    fetched or loaded once and shared through the caches and the model registry.
+    """
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': 'A JSON object is required'}), 400
+    topics = data.get('topics', [])
+    tasks = data.get('tasks', [])
+    if not isinstance(topics, list) or not all(isinstance(topic, str) and topic.strip() for topic in topics):
+        return jsonify({'error': 'topics must be a list of non-empty strings'}), 400
+    if not isinstance(tasks, list) or not all(isinstance(task, dict) for task in tasks):
+        return jsonify({'error': 'tasks must be a list of objects'}), 400
+    shared = {name: value for name, value in data.items() if name not in ('topics', 'tasks')}
+    items = [{'topic': topic} for topic in topics] + tasks
+    if not items:
+        return jsonify({'error': 'topics or tasks is required'}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({'error': f"A batch holds at most {MAX_BATCH_SIZE} tasks"}), 400
+
+    parsed = []
+    for index, item in enumerate(items):
+        settings = dict(shared, **item)
+        topic = settings.get('topic')
+        if not (isinstance(topic, str) and topic.strip()):
+            return jsonify({'error': 'topic must be a non-empty string', 'index': index}), 400
+        try:
+            parsed.append(parse_task_request(settings))
+        except ValueError as e:
+            return jsonify({'error': str(e), 'index': index}), 400
+
+    batch_id = str(uuid.uuid4())
+    contexts = [create_task(settings, batch_id) for settings in parsed]
+    if any(settings['caption_source'] == 'whisper' for settings in parsed):
+        # Load Whisper once while the first tasks write their scripts
+        warm_up_models(['base'])
+    # Released in submission order; each task's priority applies once it reaches the pipeline
+    batch_feeder.add(batch_id, [(ctx, settings['priority']) for ctx, settings in zip(contexts, parsed)])
+    return jsonify({
+        'batch_id': batch_id,
+        'task_ids': [ctx['task_id'] for ctx in contexts],
+        'status_url': f'/batches/{batch_id}',
+        'cancel_url': f'/batches/{batch_id}/cancel'
+    }), 202
+
+def batch_summary(batch_id, batch):
+    """Aggregate status of a batch's tasks; finished tasks count as fully progressed"""
+    counts, tasks, progress = {}, [], 0.0
+    for task_id in batch['task_ids']:
+        task = task_store.get(task_id)
+        # Tasks can be evicted before their batch is
+        status = task['status'] if task is not None else 'expired'
+        counts[status] = counts.get(status, 0) + 1
+        finished = status in FINISHED_STATUSES or status == 'expired'
+        progress += 100 if finished else task.get('progress', 0)
+        summary = {'task_id': task_id, 'status': status, 'status_url': f'/status/{task_id}'}
+        if task is not None:
+            summary.update(topic=task['topic'], progress=task.get('progress', 0), stage=task.get('stage'))
+            if status == 'completed':
+                summary['result'] = task['result']
+            elif status == 'failed':
+                summary['error'] = task.get('error', 'Unknown error')
+        tasks.append(summary)
+
+    total = len(batch['task_ids'])
+    if batch['finished_at'] is not None:
+        status = 'completed'
+    elif counts.get('queued', 0) == total:
+        status = 'queued'
+    else:
+        status = 'processing'
+    return {
+        'batch_id': batch_id,
+        'status': status,
+        'progress': round(progress / total, 1) if total else 100,
+        'total': total,
+        'counts': counts,
+        'held_back': batch_feeder.pending_count(batch_id),
+        'created_at': batch['created_at'],
+        'finished_at': batch['finished_at'],
+        'tasks': tasks,
+        'links': {'cancel': f'/batches/{batch_id}/cancel', 'events': '/events'}
+    }
+
+@app.route('/batches/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    batch = batch_feeder.get(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    return jsonify(batch_summary(batch_id, batch))
+
+@app.route('/batches/<batch_id>/cancel', methods=['POST'])
+def cancel_batch(batch_id):
+    batch = batch_feeder.get(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    # Latest first, so held-back tasks are dropped before the feeder releases them
+    cancelled = [task_id for task_id in reversed(batch['task_ids']) if request_cancellation(task_id)]
+    return jsonify({'status': 'cancellation_requested', 'batch_id': batch_id, 'cancelled': len(cancelled)})
+
+@app.route('/tasks/<task_id>/promote', methods=['POST'])
+def promote_task(task_id):
+    """Re-render a completed draft in final quality from its script, audio, captions and footage"""
+    draft = task_store.get(task_id)
+    if draft is None:
+        return jsonify({'error': 'Task not found'}), 404
+    artifacts = draft.get('artifacts')
+    if draft['status'] != 'completed' or not artifacts:
+        return jsonify({'error': 'Only completed draft tasks can be promoted'}), 400
+    if draft.get('promoted_to'):
+        return jsonify({'error': 'Task was already promoted', 'task_id': draft['promoted_to']}), 409
+    if not os.path.exists(artifacts['audio_file']):
+        return jsonify({'error': 'Draft audio is no longer available, generate the video again'}), 410
+
+    data = request.get_json(silent=True) or {}
+    settings = draft['settings']
+    render_backend = data.get('render_backend', settings.get('render_backend', RENDER_BACKEND))
+    if render_backend not in RENDER_BACKENDS:
+        return jsonify({'error': f"render_backend must be one of {list(RENDER_BACKENDS)}"}), 400
+    try:
+        priority = int(data.get('priority', draft.get('priority', 0)))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'priority must be an integer'}), 400
+
+    new_task_id = str(uuid.uuid4())
+    if not task_store.transition(task_id, ('completed',), promoted_to=new_task_id, updated_at=time.time()):
+        return jsonify({'error': 'Only completed draft tasks can be promoted'}), 400
+    task_store.create(new_task_id, {
+        'status': 'queued',
+        'topic': draft['topic'],
+        'language': draft.get('language', 'en'),
+        'settings': dict(settings, render_backend=render_backend, render_profile='final'),
+        'promoted_from': task_id,
+        'message': 'Waiting to start processing...',
+        'progress': 0,
+        'priority': priority,
+        'created_at': time.time(),
+        'updated_at': time.time(),
+        'cancelled': False
+    })
+
+    ctx = {
+        'task_id': new_task_id,
+        'topic': draft['topic'],
+        'language': draft.get('language', 'en'),
+        'voice': settings['voice'],
+        'font_settings': settings['font'],
+        'caption_source': settings['caption_source'],
+        'render_backend': render_backend,
+        'render_profile': 'final',
+        'audio_file': artifacts['audio_file'],
+        'video_server': "pexel",
+        'script': artifacts['script'],
+        'timed_captions': artifacts['timed_captions'],
+        'background_video_urls': artifacts['background_video_urls'],
+        'start_stage': 'render',
+        'promoted_from': task_id
+    }
+    response = submit_task(ctx, priority, start_stage='render')
+    if response[1] != 202:
+        task_store.update(task_id, promoted_to=None)
+    return response
+
+def task_event(task_id, task, event_id):
+    """Progress event with a task's stored state, for clients that just connected"""
+    event = {name: task[name] for name in PROGRESS_FIELDS if name in task}
+    return dict(event, task_id=task_id, id=event_id, time=time.time())
+
+def sse_message(event):
+    return f"id: {event['id']}\nevent: progress\ndata: {json.dumps(event)}\n\n"
+
+def event_stream(task_id, initial_events, since):
+    """Server-sent events after `since`, ending once task_id (if given) finishes"""
+    position = since
+    for event in initial_events:
+        yield sse_message(event)
+        if task_id and event.get('status') in FINISHED_STATUSES:
+            return
+    while True:
+        events = progress_bus.wait(position, task_id, timeout=SSE_HEARTBEAT_SECONDS)
+        if not events:
+            yield ": keep-alive\n\n"
+            continue
+        for event in events:
+            position = event['id']
+            yield sse_message(event)
+            if task_id and event.get('status') in FINISHED_STATUSES:
+                return
+
+def progress_events(task_id=None):
+    """Progress of one task or of all unfinished tasks, as an event stream or a long poll.
+
+    Clients sending Accept: text/event-stream (EventSource) get server-sent
+    events, starting with the current state unless Last-Event-ID resumes a
+    stream. Other clients get JSON: the current state without ?since=, or
+    the events after ?since=<last_id>, waiting up to ?wait= seconds for one.
+    """
+    task = None
+    if task_id is not None:
+        task = task_store.get(task_id)
+        if task is None:
+            return jsonify({'error': 'Task not found'}), 404
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    # Read before the state so no change falls between the two
+    last_id = progress_bus.last_id
+    finished = task is not None and task['status'] in FINISHED_STATUSES
+
+    if 'text/event-stream' in request.headers.get('Accept', ''):
+        if finished:
+            # Nothing more will happen: send the final state and end the stream,
+            # even for a client resuming with Last-Event-ID
+            initial_events, since = [task_event(task_id, task, last_id)], last_id
+        elif since is not None and progress_bus.covers(since):
+            initial_events = progress_bus.events_since(since, task_id)
+        elif task_id is not None:
+            initial_events, since = [task_event(task_id, task, last_id)], last_id
+        else:
+            initial_events = [dict(state, id=last_id) for state in progress_bus.snapshot()]
+            since = last_id
+        return Response(event_stream(task_id, initial_events, since), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    if since is None or not progress_bus.covers(since):
+        # New client, or one that fell behind the history: start over from the current state
+        tasks = [task_event(task_id, task, last_id)] if task_id is not None else progress_bus.snapshot()
+        return jsonify({'last_id': last_id, 'tasks': tasks})
+    wait = min(max(request.args.get('wait', 0, type=float), 0), LONG_POLL_MAX_SECONDS)
+    if wait and not finished:
+        events = progress_bus.wait(since, task_id, timeout=wait)
+    else:
+        events = progress_bus.events_since(since, task_id)
+    return jsonify({'last_id': events[-1]['id'] if events else max(since, last_id), 'events': events})
+
+@app.route('/events', methods=['GET'])
+def all_task_events():
+    return progress_events()
+
+@app.route('/events/<task_id>', methods=['GET'])
+def task_events(task_id):
+    return progress_events(task_id)
+
 # Update your existing status endpoint
 @app.route('/status/<task_id>', methods=['GET'])
 def get_status(task_id):
-    with task_lock:
-        if task_id not in tasks:
-            return jsonify({'error': 'Task not found'}), 404
-        
-        task = tasks[task_id]
-        response = {
-            'task_id': task_id,
-            'status': task['status'],
-            'progress': task.get('progress', 0),
-            'message': task.get('message', ''),
-            'topic': task['topic'],
-            'created_at': task.get('created_at'),
-            'updated_at': task.get('updated_at'),
-            'parameters': {
-                'language': task.get('language', 'en'),
-                'voice': task['settings'].get('voice', 'en-AU-WilliamNeural'),
-                'font_settings': task['settings'].get('font', {
-                    'size': 100,
-                    'color': 'white',
-                    'stroke_color': 'black',
-                    'stroke_width': 3,
-                    'family': 'Arial'
-                })
-            },
-            'links': {
-                'cancel': f'/tasks/{task_id}/cancel'
-            }
+    task = task_store.get(task_id)
+    if task is None:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    response = {
+        'task_id': task_id,
+        'status': task['status'],
+        'progress': task.get('progress', 0),
+        'message': task.get('message', ''),
+        'topic': task['topic'],
+        'created_at': task.get('created_at'),
+        'updated_at': task.get('updated_at'),
+        'stage_timings': task.get('stage_timings', {}),
+        'parameters': {
+            'language': task.get('language', 'en'),
+            'voice': task['settings'].get('voice', 'en-AU-WilliamNeural'),
+            'caption_source': task['settings'].get('caption_source', DEFAULT_CAPTION_SOURCE),
+            'render_backend': task['settings'].get('render_backend', RENDER_BACKEND),
+            'render_profile': task['settings'].get('render_profile', 'final'),
+            'font_settings': task['settings'].get('font', {
+                'size': 100,
+                'color': 'white',
+                'stroke_color': 'black',
+                'stroke_width': 3,
+                'family': 'Arial'
+            })
+        },
+        'links': {
+            'cancel': f'/tasks/{task_id}/cancel',
+            'events': f'/events/{task_id}'
         }
-        
-        if task['status'] == 'completed':
-            response['result'] = task['result']
-        elif task['status'] == 'failed':
-            response['error'] = {
-                'message': task.get('error', 'Unknown error'),
-                'type': task.get('error_type', 'unknown'),
-                'retryable': task.get('retryable', False),
-                'suggestion': task.get('suggestion', 'Please try again later')
+    }
+    
+    if task.get('batch_id'):
+        response['batch_id'] = task['batch_id']
+        response['links']['batch'] = f"/batches/{task['batch_id']}"
+    if task.get('promoted_from'):
+        response['links']['draft'] = f"/status/{task['promoted_from']}"
+    if task['status'] == 'completed':
+        response['result'] = task['result']
+        if task.get('promoted_to'):
+            response['links']['final'] = f"/status/{task['promoted_to']}"
+        elif task.get('artifacts'):
+            response['links']['promote'] = f'/tasks/{task_id}/promote'
+    elif task['status'] == 'failed':
+        response['error'] = {
+            'message': task.get('error', 'Unknown error'),
+            'type': task.get('error_type', 'unknown'),
+            'retryable': task.get('retryable', False),
+            'suggestion': task.get('suggestion', 'Please try again later')
+        }
+    elif task['status'] == 'cancelled':
+        response['message'] = 'Task was cancelled by user'
+    
+    if task['status'] in ('queued', 'processing'):
+        response['stage'] = task.get('stage')
+        if task.get('progress_detail'):
+            response['progress_detail'] = task['progress_detail']
+        queued = executor.position(task_id)
+        if queued is not None:
+            stage, position, depth, estimated_wait = queued
+            response['queue'] = {
+                'stage': stage,
+                'position': position,
+                'depth': depth,
+                'estimated_wait': estimated_wait
             }
-        elif task['status'] == 'cancelled':
-            response['message'] = 'Task was cancelled by user'
-        
-        return jsonify(response)
+    
+    return jsonify(response)
 
 if __name__ == "__main__":
     try:
+        warm_up_models()
         app.run(host='0.0.0.0', port=5050)
     except Exception as e:
         print(f"Failed to start server: {str(e)}")
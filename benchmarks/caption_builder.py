@@ -0,0 +1,117 @@
+"""
+Micro-benchmark of getCaptionsWithTime on synthetic 10, 30 and 60 minute
+transcripts, comparing the previous dict-scan builder with the bisect one.
+
+    python -m benchmarks.caption_builder
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from utility.captions.timed_captions_generator import getCaptionsWithTime, cleanWord
+
+WORDS_PER_MINUTE = 150
+VOCABULARY = ("the quick brown fox jumps over a lazy dog while ocean waves crash "
+              "near ancient cities, and octopuses have three hearts! Honey never spoils.").split()
+
+
+def synthetic_transcript(minutes, seed=0):
+    """Whisper-shaped analysis dict with roughly WORDS_PER_MINUTE words per minute"""
+    rng = random.Random(seed)
+    t = 0.0
+    segments, segment = [], []
+    for i in range(int(minutes * WORDS_PER_MINUTE)):
+        duration = rng.uniform(0.2, 0.6)
+        segment.append({'text': rng.choice(VOCABULARY), 'start': t, 'end': t + duration})
+        t += duration
+        if len(segment) == 20:
+            segments.append({'words': segment})
+            segment = []
+    if segment:
+        segments.append({'words': segment})
+    text = ' ' + ' '.join(w['text'] for s in segments for w in s['words'])
+    return {'text': text, 'segments': segments}
+
+
+def legacy_getCaptionsWithTime(whisper_analysis, maxCaptionSize=15, considerPunctuation=False):
+    """The quadratic implementation this module replaced, kept as the reference"""
+    def splitWordsBySize(words, maxCaptionSize):
+        halfCaptionSize = maxCaptionSize / 2
+        captions = []
+        while words:
+            caption = words[0]
+            words = words[1:]
+            while words and len(caption + ' ' + words[0]) <= maxCaptionSize:
+                caption += ' ' + words[0]
+                words = words[1:]
+                if len(caption) >= halfCaptionSize and words:
+                    break
+            captions.append(caption)
+        return captions
+
+    index = 0
+    wordLocationToTime = {}
+    for segment in whisper_analysis['segments']:
+        for word in segment['words']:
+            newIndex = index + len(word['text']) + 1
+            wordLocationToTime[(index, newIndex)] = word['end']
+            index = newIndex
+
+    def interpolateTimeFromDict(word_position, d):
+        for key, value in d.items():
+            if key[0] <= word_position <= key[1]:
+                return value
+        return None
+
+    position = 0
+    start_time = 0
+    CaptionsPairs = []
+    text = whisper_analysis['text']
+    if considerPunctuation:
+        sentences = re.split(r'(?<=[.!?]) +', text)
+        words = [word for sentence in sentences for word in splitWordsBySize(sentence.split(), maxCaptionSize)]
+    else:
+        words = [cleanWord(word) for word in splitWordsBySize(text.split(), maxCaptionSize)]
+    for word in words:
+        position += len(word) + 1
+        end_time = interpolateTimeFromDict(position, wordLocationToTime)
+        if end_time and word:
+            CaptionsPairs.append(((start_time, end_time), word))
+            start_time = end_time
+    return CaptionsPairs
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=int, nargs="+", default=[10, 30, 60])
+    args = parser.parse_args()
+
+    results = []
+    for minutes in args.minutes:
+        analysis = synthetic_transcript(minutes)
+        for considerPunctuation in (False, True):
+            old, old_s = timed(legacy_getCaptionsWithTime, analysis, considerPunctuation=considerPunctuation)
+            new, new_s = timed(getCaptionsWithTime, analysis, considerPunctuation=considerPunctuation)
+            if old != new:
+                raise AssertionError(f"Output differs for {minutes} min transcript")
+            results.append({
+                "minutes": minutes,
+                "consider_punctuation": considerPunctuation,
+                "captions": len(new),
+                "legacy_s": round(old_s, 4),
+                "bisect_s": round(new_s, 4),
+                "speedup": round(old_s / new_s, 1) if new_s else None,
+            })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Whole-pipeline benchmark without Ollama, Pexels or edge-tts: local fake
+/api/chat and /videos/search servers (with injected latency, malformed LLM
+output and failed searches), generated test footage and a sine-tone TTS
+stand-in. Tasks are driven through generate_video_async ("direct"), through
+the Flask API over HTTP one /generate request each ("api"), or as a single
+/generate/batch request ("batch", concurrency being the batch's tasks in
+flight) at each concurrency level, and the report gives per-stage p50/p95,
+throughput, peak RSS and CPU-seconds as JSON.
+
+    python -m benchmarks.end_to_end --tasks 8 --concurrency 1 2 4 --modes direct api batch
+
+Every (mode, concurrency) level runs in its own subprocess so peak RSS,
+CPU-seconds and caches are its own.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from benchmarks.fake_pexels import FakePexelsServer
+from benchmarks.synthetic_media import MediaServer, make_audio, make_footage
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Where get_output_media writes finished videos
+OUTPUT_DIR = "/app/output"
+# Narration pace of the TTS stand-in
+SECONDS_PER_WORD = 0.35
+FINISHED = ('completed', 'failed', 'cancelled')
+
+
+def cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def percentile(values, q):
+    """Nearest-rank percentile, None for no values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)], 3)
+
+
+def summarize(values):
+    return {'p50': percentile(values, 50), 'p95': percentile(values, 95), 'max': percentile(values, 100),
+            'count': len(values)}
+
+
+def fake_tts(latency):
+    """Replacements for the edge-tts functions: a sine tone as long as the script would be spoken"""
+    async def generate_audio_with_word_boundaries(text, output_filename, voice=None, cancel_token=None):
+        await asyncio.sleep(latency)
+        words = text.split() or ['silence']
+        make_audio(output_filename, max(1.0, len(words) * SECONDS_PER_WORD))
+        return [{'text': word, 'start': i * SECONDS_PER_WORD, 'end': (i + 0.9) * SECONDS_PER_WORD}
+                for i, word in enumerate(words)]
+
+    async def generate_audio(text, output_filename, voice=None, cancel_token=None):
+        await generate_audio_with_word_boundaries(text, output_filename, voice, cancel_token)
+
+    return generate_audio, generate_audio_with_word_boundaries
+
+
+def task_request(index, args):
+    return {
+        'topic': f"benchmark facts {index} {uuid.uuid4().hex[:6]}",
+        'caption_source': 'tts',
+        'render_backend': args.backend,
+        'render_profile': args.profile,
+    }
+
+
+def run_direct(app, index, args):
+    """Create a task the way /generate does and run all its stages on this thread"""
+    from utility.tasks.cancellation import CancellationToken
+
+    data = task_request(index, args)
+    task_id = str(uuid.uuid4())
+    font_settings = {'size': 75, 'color': 'white', 'stroke_color': 'black', 'stroke_width': 3, 'family': 'Arial'}
+    app.task_store.create(task_id, {
+        'status': 'queued', 'topic': data['topic'], 'language': 'en', 'settings': {},
+        'message': '', 'progress': 0, 'created_at': time.time(), 'updated_at': time.time(), 'cancelled': False
+    })
+    ctx = {
+        'task_id': task_id,
+        'topic': data['topic'],
+        'language': 'en',
+        'voice': 'en-AU-WilliamNeural',
+        'font_settings': font_settings,
+        'caption_source': data['caption_source'],
+        'render_backend': data['render_backend'],
+        'render_profile': data['render_profile'],
+        'use_llm_cache': True,
+        'audio_file': f"audio_tts_{task_id}.wav",
+        'video_server': "pexel",
+        'cancel_token': CancellationToken(),
+        'stage_ready_at': time.time()
+    }
+    try:
+        app.generate_video_async(ctx)
+    except Exception as e:
+        app.handle_task_error(ctx, e)
+    return app.task_store.get(task_id)
+
+
+def run_api(base_url, index, args):
+    """Submit a task over HTTP and follow its progress with long polls until it finishes"""
+    import requests
+
+    while True:
+        response = requests.post(f"{base_url}/generate", json=task_request(index, args), timeout=30)
+        if response.status_code != 429:
+            break
+        time.sleep(float(response.headers.get('Retry-After', 1)))
+    response.raise_for_status()
+    task_id = response.json()['task_id']
+
+    since, status = 0, None
+    while status not in FINISHED:
+        poll = requests.get(f"{base_url}/events/{task_id}", params={'since': since, 'wait': 30}, timeout=60).json()
+        since = poll['last_id']
+        for event in poll.get('events', poll.get('tasks', [])):
+            status = event.get('status', status)
+    return requests.get(f"{base_url}/status/{task_id}", timeout=30).json()
+
+
+def run_batch(base_url, args):
+    """Submit every task in one /generate/batch request and poll the batch until it finishes.
+
+    Returns (task, seconds from submission to the task's last update) per task.
+    """
+    import requests
+
+    submitted = time.time()
+    response = requests.post(f"{base_url}/generate/batch",
+                             json={'tasks': [task_request(index, args) for index in range(args.tasks)]}, timeout=60)
+    response.raise_for_status()
+    batch_url = f"{base_url}{response.json()['status_url']}"
+    while requests.get(batch_url, timeout=30).json()['status'] != 'completed':
+        time.sleep(0.5)
+    tasks = [requests.get(f"{base_url}/status/{task_id}", timeout=30).json()
+             for task_id in response.json()['task_ids']]
+    return [(task, task['updated_at'] - submitted) for task in tasks]
+
+
+def run_level(mode, concurrency, args):
+    """One benchmark level in this process; returns its report"""
+    footage_names = sorted(name for name in os.listdir(args.footage_dir) if name.endswith('.mp4'))
+    with MediaServer(args.footage_dir) as media, \
+            FakeOllamaServer(latency=args.llm_latency, token_delay=args.token_delay,
+                             malformed_rate=args.malformed_rate, script_words=args.script_words) as ollama, \
+            FakePexelsServer(latency=args.pexels_latency, error_rate=args.pexels_error_rate,
+                             clip_urls=[media.url(name) for name in footage_names]) as pexels:
+        os.environ["OLLAMA_HOST"] = ollama.url
+        os.environ["PEXELS_API_URL"] = pexels.url
+        os.environ["BATCH_MAX_IN_FLIGHT"] = str(concurrency)
+        # The app reads OLLAMA_HOST and PEXELS_API_URL at import, so it comes after the servers
+        import app
+        from utility.video.video_search_query_generator import structured_output_stats
+
+        app.generate_audio, app.generate_audio_with_word_boundaries = fake_tts(args.tts_latency)
+
+        server = None
+        if mode in ('api', 'batch'):
+            from werkzeug.serving import make_server
+            server = make_server('127.0.0.1', 0, app.app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f"http://127.0.0.1:{server.server_port}"
+
+        def run(index):
+            start = time.perf_counter()
+            task = run_direct(app, index, args) if mode == 'direct' else run_api(base_url, index, args)
+            return task, time.perf_counter() - start
+
+        cpu_before, start = cpu_seconds(), time.perf_counter()
+        if mode == 'batch':
+            results = run_batch(base_url, args)
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(run, range(args.tasks)))
+        wall = time.perf_counter() - start
+        cpu = cpu_seconds() - cpu_before
+        if server is not None:
+            server.shutdown()
+
+        stage_seconds, stage_waits, latencies, statuses = {}, {}, [], {}
+        for task, latency in results:
+            status = task['status']
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 'completed':
+                latencies.append(latency)
+                video = os.path.join(OUTPUT_DIR, os.path.basename(task['result']['video_path']))
+                if os.path.exists(video):
+                    os.remove(video)
+            for stage, timing in (task.get('stage_timings') or {}).items():
+                stage_seconds.setdefault(stage, []).append(timing['seconds'])
+                stage_waits.setdefault(stage, []).append(timing['waited'])
+
+        return {
+            'mode': mode,
+            'concurrency': concurrency,
+            'tasks': args.tasks,
+            'statuses': statuses,
+            'wall_s': round(wall, 2),
+            'throughput_per_min': round(statuses.get('completed', 0) / wall * 60, 3) if wall else None,
+            'task_latency_s': summarize(latencies),
+            'stage_seconds': {stage: summarize(values) for stage, values in stage_seconds.items()},
+            'stage_wait_seconds': {stage: summarize(values) for stage, values in stage_waits.items()},
+            'cpu_s': round(cpu, 2),
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'llm_requests': ollama.requests,
+            'llm_malformed_answers': ollama.malformed,
+            'keyword_output': structured_output_stats(),
+            'pexels_requests': pexels.requests,
+            'search_requests_shared': app.get_search_cache().stats()['coalesced'],
+        }
+
+
+def level_args(args):
+    """Command-line options passed on to each level's subprocess"""
+    passed = []
+    for name in ('tasks', 'backend', 'profile', 'llm_latency', 'token_delay', 'malformed_rate', 'script_words',
+                 'pexels_latency', 'pexels_error_rate', 'tts_latency', 'footage_dir'):
+        passed += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=8, help="tasks per level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", default=["direct", "api", "batch"], choices=["direct", "api", "batch"])
+    parser.add_argument("--backend", default="ffmpeg", help="render backend")
+    parser.add_argument("--profile", default="draft", help="render profile, e.g. final or draft")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds to the first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds per streamed chunk")
+    parser.add_argument("--malformed-rate", type=float, default=0.1, help="share of unparseable LLM answers")
+    parser.add_argument("--script-words", type=int, default=60)
+    parser.add_argument("--pexels-latency", type=float, default=0.2)
+    parser.add_argument("--pexels-error-rate", type=float, default=0.0, help="share of searches failing with 503")
+    parser.add_argument("--tts-latency", type=float, default=0.3)
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--footage-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--run-level", nargs=2, metavar=("MODE", "CONCURRENCY"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_level:
+        mode, concurrency = args.run_level
+        print(json.dumps(run_level(mode, int(concurrency), args)))
+        return
+
+    work_dir = tempfile.mkdtemp(prefix="bench_e2e_")
+    args.footage_dir = os.path.join(work_dir, "footage")
+    make_footage(args.footage_dir)
+    levels = []
+    try:
+        for mode in args.modes:
+            for concurrency in args.concurrency:
+                # Fresh working directory, task store and caches for every level
+                level_dir = tempfile.mkdtemp(dir=work_dir)
+                env = dict(os.environ,
+                           PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])),
+                           TASK_STORE="memory",
+                           CACHE_DIR=os.path.join(level_dir, "cache"),
+                           MEDIA_CACHE_DIR=os.path.join(level_dir, "media"),
+                           MAX_QUEUE_DEPTH=str(max(args.tasks, 20)))
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.end_to_end", "--run-level", mode, str(concurrency),
+                     *level_args(args)],
+                    cwd=level_dir, env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+                levels.append(json.loads(output.strip().splitlines()[-1]))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'config': {name: getattr(args, name) for name in
+                   ('tasks', 'backend', 'profile', 'llm_latency', 'token_delay', 'malformed_rate', 'script_words',
+                    'pexels_latency', 'pexels_error_rate', 'tts_latency')},
+        'levels': levels
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Local stand-in for Ollama's /api/chat with injected latency and malformed output.
+
+Script requests (a "script" object schema) get a generated facts script,
+keyword requests get one segment of three visual keywords per ~3 seconds of
+the timed captions in the prompt. Both streamed (NDJSON) and single-shot
+answers are supported, and a configurable share of answers is unparseable.
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCRIPT_WORDS = ("honey never spoils and archaeologists found edible pots of it in ancient tombs "
+                "octopuses have three hearts and blue blood while bananas are berries but strawberries "
+                "are not a single cloud can weigh more than a million pounds").split()
+KEYWORDS = ["ocean waves", "space galaxy", "city skyline", "forest trail", "desert dunes",
+            "rainy street", "mountain lake", "busy market", "night sky", "snowy peak",
+            "honey jar", "octopus swimming", "banana bunch", "storm clouds", "ancient tomb"]
+# Answers a misbehaving model gives instead of JSON
+MALFORMED_ANSWERS = [
+    "Sure! Here is the JSON you asked for, with three keywords for every segment of the captions. " * 8,
+    "[[[0, 2], [\"city\", \"street\"",
+    "{\"script\" 'missing colon and quotes'}",
+]
+
+
+def fake_script(words, rng):
+    return ' '.join(rng.choice(SCRIPT_WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def fake_segments(prompt, rng, segment_seconds=3.0):
+    """Keyword segments covering the timed captions found in prompt"""
+    match = re.search(r"Timed Captions: (\[.*\])", prompt, re.S)
+    captions = json.loads(match.group(1)) if match else [[[0, 10], "fallback"]]
+    end = max((caption[0][1] for caption in captions), default=10)
+    segments, t = [], 0.0
+    while t < end:
+        t2 = min(round(t + segment_seconds, 2), end)
+        segments.append([[round(t, 2), t2], rng.sample(KEYWORDS, 3)])
+        t = t2
+    return segments
+
+
+class FakeOllamaServer:
+    """Threaded HTTP server answering /api/chat.
+
+    latency is the time to the first token; token_delay is added per streamed
+    chunk of chunk_chars characters (and once per chunk for whole answers).
+    malformed_rate is the share of answers that are not valid JSON.
+    """
+
+    def __init__(self, latency=0.5, token_delay=0.01, chunk_chars=16, malformed_rate=0.0, script_words=60,
+                 seed=0, port=0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.chunk_chars = chunk_chars
+        self.malformed_rate = malformed_rate
+        self.script_words = script_words
+        self.requests = 0
+        self.malformed = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                # Connection check at start-up
+                if self.path != '/api/tags':
+                    self.send_error(404)
+                    return
+                self._send_json({'models': [{'name': 'fake'}]})
+
+            def do_POST(self):
+                if self.path != '/api/chat':
+                    self.send_error(404)
+                    return
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                content = server.answer(payload)
+                chunks = [content[i:i + server.chunk_chars] for i in range(0, len(content), server.chunk_chars)]
+                time.sleep(server.latency)
+                if not payload.get('stream', True):
+                    time.sleep(server.token_delay * len(chunks))
+                    self._send_json({'model': payload.get('model'), 'message': {'role': 'assistant', 'content': content},
+                                     'done': True})
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for chunk in chunks:
+                        time.sleep(server.token_delay)
+                        self._write_chunk({'message': {'role': 'assistant', 'content': chunk}, 'done': False})
+                    self._write_chunk({'message': {'role': 'assistant', 'content': ''}, 'done': True})
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client abandoned a malformed answer or was cancelled
+                    self.close_connection = True
+
+            def _write_chunk(self, obj):
+                line = (json.dumps(obj) + "\n").encode()
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+
+            def _send_json(self, obj):
+                body = json.dumps(obj).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def answer(self, payload):
+        with self._lock:
+            self.requests += 1
+            if self._rng.random() < self.malformed_rate:
+                self.malformed += 1
+                return self._rng.choice(MALFORMED_ANSWERS)
+            rng = random.Random(self._rng.random())
+        schema = payload.get('format')
+        prompt = payload['messages'][-1]['content']
+        if isinstance(schema, dict) and schema.get('type') == 'object':
+            return json.dumps({'script': fake_script(self.script_words, rng)})
+        return json.dumps(fake_segments(prompt, rng))
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,96 @@
+"""
+Local stand-in for the Pexels /videos/search endpoint with injected latency.
+
+Every query returns a deterministic page of 1920x1080 results whose ids
+overlap between related queries, so footage deduplication is exercised.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def fake_videos(query, per_page=15, clip_url=None, clip_urls=None):
+    """Deterministic search results for query; clip_urls are spread over the video ids"""
+    seed = int(hashlib.sha256(query.encode()).hexdigest(), 16)
+    videos = []
+    for i in range(per_page):
+        # A small id space makes different queries return some of the same videos
+        video_id = (seed >> (i * 4)) % 60 + 1000
+        link = clip_urls[video_id % len(clip_urls)] if clip_urls else clip_url
+        videos.append({
+            'id': video_id,
+            'width': 1920,
+            'height': 1080,
+            'duration': 5 + (seed >> i) % 25,
+            'video_files': [{
+                'width': 1920,
+                'height': 1080,
+                'link': link or f"https://videos.pexels.com/video-files/{video_id}/{video_id}-hd_1920_1080_25fps.mp4"
+            }]
+        })
+    return {'videos': videos, 'per_page': per_page}
+
+
+class FakePexelsServer:
+    """Threaded HTTP server answering /videos/search after `latency` seconds.
+
+    error_rate is the share of searches answered with 503.
+    """
+
+    def __init__(self, latency=0.2, clip_url=None, port=0, clip_urls=None, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.clip_url = clip_url
+        self.clip_urls = clip_urls
+        self.error_rate = error_rate
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if parsed.path != '/videos/search':
+                    self.send_error(404)
+                    return
+                with server._lock:
+                    server.requests += 1
+                    failed = server._rng.random() < server.error_rate
+                time.sleep(server.latency)
+                if failed:
+                    self.send_error(503)
+                    return
+                params = parse_qs(parsed.query)
+                body = json.dumps(fake_videos(
+                    params.get('query', [''])[0],
+                    int(params.get('per_page', ['15'])[0]),
+                    server.clip_url,
+                    server.clip_urls
+                )).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/videos/search"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
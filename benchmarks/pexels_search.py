@@ -0,0 +1,77 @@
+"""
+generate_video_url against a local fake Pexels server with injected latency:
+segment-by-segment searching (before) versus concurrent searches with a
+deterministic dedup pass (after). Both must pick the same footage.
+
+    python -m benchmarks.pexels_search --segments 20 --latency 0.3
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.fake_pexels import FakePexelsServer
+
+KEYWORDS = ["ocean waves", "space galaxy", "city skyline", "forest trail", "desert dunes",
+            "rainy street", "mountain lake", "busy market", "night sky", "snowy peak"]
+
+
+def synthetic_searches(segments):
+    searches = []
+    for i in range(segments):
+        terms = [KEYWORDS[(i + k) % len(KEYWORDS)] for k in range(3)]
+        searches.append([[i * 2.5, (i + 1) * 2.5], terms])
+    return searches
+
+
+def sequential_generate_video_url(timed_video_searches, getBestVideo, build_segment_queries):
+    """The segment-at-a-time loop generate_video_url used before searches ran concurrently"""
+    timed_video_urls = []
+    used_video_ids = []
+    for (t1, t2), search_terms in timed_video_searches:
+        url = None
+        for query in build_segment_queries(search_terms):
+            result = getBestVideo(query, True, used_video_ids)
+            if result:
+                url, vid_id = result
+                used_video_ids.append(vid_id)
+                break
+        timed_video_urls.append([[t1, t2], url])
+    return timed_video_urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    with FakePexelsServer(latency=args.latency) as server:
+        os.environ["PEXELS_API_URL"] = server.url
+        # Every lookup goes to the server so both modes pay the same latency
+        os.environ["PEXELS_CACHE_TTL"] = "0"
+        os.environ["CACHE_DIR"] = tempfile.mkdtemp()
+        from utility.video import background_video_generator as bvg
+
+        searches = synthetic_searches(args.segments)
+        results = {}
+        outputs = {}
+        for mode in ("sequential", "concurrent"):
+            server.requests = 0
+            start = time.perf_counter()
+            if mode == "sequential":
+                outputs[mode] = sequential_generate_video_url(searches, bvg.getBestVideo, bvg.build_segment_queries)
+            else:
+                outputs[mode] = bvg.generate_video_url(searches, "pexel")
+            results[mode] = {
+                "wall_s": round(time.perf_counter() - start, 3),
+                "http_requests": server.requests,
+            }
+
+    results["identical_output"] = outputs["sequential"] == outputs["concurrent"]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
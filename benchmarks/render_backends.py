@@ -0,0 +1,76 @@
+"""
+Side-by-side render of the same timeline with the MoviePy compositor and the
+native ffmpeg filtergraph backend, reporting wall time and CPU-seconds
+(this process plus ffmpeg children).
+
+    python -m benchmarks.render_backends --seconds 30 --segment 2.5
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic_media import MediaServer, make_audio, make_footage, synthetic_captions
+
+
+def cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--segment", type=float, default=2.5)
+    parser.add_argument("--no-captions", action="store_true")
+    parser.add_argument("--backends", nargs="+", default=["moviepy", "ffmpeg"])
+    parser.add_argument("--profile", default="final", help="render profile, e.g. final or draft")
+    parser.add_argument("--chunks", type=int, default=1, help="parallel render chunks per video")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_render_")
+    os.environ["MEDIA_CACHE_DIR"] = os.path.join(work_dir, "cache")
+    from utility.render import render_engine
+
+    footage_dir = os.path.join(work_dir, "footage")
+    names = make_footage(footage_dir)
+    captions = [] if args.no_captions else synthetic_captions(args.seconds)
+
+    results = []
+    with MediaServer(footage_dir) as server:
+        segments, t, i = [], 0.0, 0
+        while t < args.seconds:
+            end = min(t + args.segment, args.seconds)
+            segments.append([[t, end], server.url(names[i % len(names)])])
+            t, i = end, i + 1
+
+        # Fill the media cache first so both backends start from the same state
+        warm_dir = tempfile.mkdtemp(dir=work_dir)
+        render_engine.prepare_background_clips(
+            render_engine.get_media_cache(), segments, warm_dir, render_engine.get_render_profile(args.profile))
+
+        for backend in args.backends:
+            # get_output_media deletes the narration when it is done
+            audio = make_audio(os.path.join(work_dir, f"narration_{backend}.wav"), args.seconds)
+            cpu_before, start = cpu_seconds(), time.perf_counter()
+            output = render_engine.get_output_media(audio, captions, segments, "pexel", render_backend=backend,
+                                                    render_profile=args.profile, render_chunks=args.chunks)
+            results.append({
+                "backend": backend,
+                "profile": args.profile,
+                "chunks": args.chunks,
+                "wall_s": round(time.perf_counter() - start, 2),
+                "cpu_s": round(cpu_seconds() - cpu_before, 2),
+                "output": output,
+            })
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Cold-start cost of the API process: time to import app, to answer the first
+/ready probe, and for the background import warm-up, plus peak RSS and the
+slowest imports, each measured in a fresh interpreter. Runs once with a local
+fake Ollama up and once with Ollama unreachable, which must not stop the
+process from starting.
+
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.fake_ollama import FakeOllamaServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# A port nothing listens on, standing in for Ollama being down
+UNREACHABLE_OLLAMA = "http://127.0.0.1:9"
+
+PROBE = """
+import json, resource, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+ready = app.app.test_client().get('/ready')
+first_response = time.perf_counter()
+from utility.warmup import warm_up_imports
+warm_up_imports(background=False)
+warmed = time.perf_counter()
+print(json.dumps({
+    'import_s': imported - start,
+    'first_ready_s': first_response - start,
+    'ready_status': ready.status_code,
+    'warmup_s': warmed - first_response,
+    'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+
+def run_python(code, ollama_host, work_dir, *options):
+    env = dict(os.environ,
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])),
+               OLLAMA_HOST=ollama_host,
+               TASK_STORE="memory",
+               CACHE_DIR=os.path.join(work_dir, "cache"))
+    return subprocess.run([sys.executable, *options, "-c", code], cwd=work_dir, env=env, check=True,
+                          capture_output=True, text=True)
+
+
+def probe(ollama_host, work_dir):
+    return json.loads(run_python(PROBE, ollama_host, work_dir).stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(importtime_output, top=10):
+    """Top-level packages by cumulative import time from -X importtime output"""
+    totals = {}
+    for line in importtime_output.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)", line)
+        if match and len(match.group(2)) <= 2:
+            totals[match.group(3)] = int(match.group(1)) / 1e6
+    return [{'module': name, 'seconds': round(seconds, 3)}
+            for name, seconds in sorted(totals.items(), key=lambda item: -item[1])[:top]]
+
+
+def summarize(runs):
+    summary = {}
+    for key in ('import_s', 'first_ready_s', 'warmup_s', 'peak_rss_mb'):
+        values = [run[key] for run in runs]
+        summary[key] = {'median': round(statistics.median(values), 3), 'max': round(max(values), 3)}
+    summary['ready_status'] = sorted({run['ready_status'] for run in runs})
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    report = {}
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as work_dir, FakeOllamaServer(latency=0) as ollama:
+        for scenario, host in (("ollama_up", ollama.url), ("ollama_down", UNREACHABLE_OLLAMA)):
+            runs = [probe(host, work_dir) for _ in range(args.runs)]
+            report[scenario] = summarize(runs)
+        # What importing app alone still costs, heaviest first
+        report["slowest_imports"] = slowest_imports(
+            run_python("import app", ollama.url, work_dir, "-X", "importtime").stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
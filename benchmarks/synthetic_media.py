@@ -0,0 +1,81 @@
+"""
+Generated stand-ins for stock footage and narration, and a local HTTP server to
+serve them, so render benchmarks need neither Pexels nor edge-tts.
+"""
+import functools
+import os
+import subprocess
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from moviepy.config import get_setting
+
+
+def make_clip(path, seconds=15, width=1920, height=1080, fps=25):
+    """Write an H.264 test pattern clip"""
+    subprocess.run([
+        get_setting("FFMPEG_BINARY"), '-y', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f"testsrc2=size={width}x{height}:rate={fps}",
+        '-t', str(seconds), '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p',
+        path
+    ], check=True)
+    return path
+
+
+def make_audio(path, seconds=30):
+    """Write a sine tone wav to stand in for TTS narration"""
+    subprocess.run([
+        get_setting("FFMPEG_BINARY"), '-y', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f"sine=frequency=220:duration={seconds}",
+        path
+    ], check=True)
+    return path
+
+
+def synthetic_captions(seconds, words_per_caption=2):
+    words = "honey never spoils and octopuses have three hearts with blue blood".split()
+    captions, t, i = [], 0.0, 0
+    while t < seconds:
+        text = ' '.join(words[(i + k) % len(words)] for k in range(words_per_caption))
+        captions.append(((round(t, 2), round(min(t + 0.8, seconds), 2)), text))
+        t += 0.8
+        i += words_per_caption
+    return captions
+
+
+class MediaServer:
+    """Serve a directory over HTTP on localhost"""
+
+    def __init__(self, directory, port=0):
+        handler = functools.partial(QuietHandler, directory=directory)
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, name):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/{name}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def make_footage(directory, count=4, seconds=15):
+    """Create `count` clips in directory and return their file names"""
+    os.makedirs(directory, exist_ok=True)
+    names = []
+    for i in range(count):
+        name = f"clip_{i}.mp4"
+        # Alternate sizes so some clips need re-encoding to the output profile
+        size = (1920, 1080) if i % 2 == 0 else (1280, 720)
+        make_clip(os.path.join(directory, name), seconds, *size)
+        names.append(name)
+    return names
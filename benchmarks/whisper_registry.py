@@ -0,0 +1,70 @@
+"""
+Caption latency and peak RSS with several concurrent tasks, loading the Whisper
+model per call (before) versus sharing it through the model registry (after).
+
+    python -m benchmarks.whisper_registry --audio sample.wav --tasks 4
+
+Each mode runs in its own subprocess so peak RSS is measured independently.
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _caption_task(mode, audio, model_size):
+    from whisper_timestamped import load_model, transcribe_timestamped
+    from utility.captions.timed_captions_generator import generate_timed_captions, getCaptionsWithTime
+
+    start = time.perf_counter()
+    if mode == "before":
+        model = load_model(model_size)
+        getCaptionsWithTime(transcribe_timestamped(model, audio, verbose=False, fp16=False))
+    else:
+        generate_timed_captions(audio, model_size)
+    return time.perf_counter() - start
+
+
+def run_mode(mode, audio, tasks, model_size):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=tasks) as pool:
+        latencies = list(pool.map(lambda _: _caption_task(mode, audio, model_size), range(tasks)))
+    return {
+        "mode": mode,
+        "tasks": tasks,
+        "wall_s": round(time.perf_counter() - start, 3),
+        "task_latency_s": [round(l, 3) for l in latencies],
+        "mean_task_latency_s": round(sum(latencies) / len(latencies), 3),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", required=True, help="Path to a narration wav/mp3 file")
+    parser.add_argument("--tasks", type=int, default=4)
+    parser.add_argument("--model-size", default="base")
+    parser.add_argument("--mode", choices=["before", "after"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.audio, args.tasks, args.model_size)))
+        return
+
+    results = []
+    for mode in ("before", "after"):
+        out = subprocess.check_output([
+            sys.executable, "-m", "benchmarks.whisper_registry",
+            "--audio", args.audio, "--tasks", str(args.tasks),
+            "--model-size", args.model_size, "--mode", mode,
+        ])
+        results.append(json.loads(out.decode().strip().splitlines()[-1]))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+pytest.importorskip("moviepy")
+
+from benchmarks.synthetic_media import make_clip
+from utility.render.chunked_render import chunk_timeline, plan_chunks, render_chunked
+from utility.render.profiles import get_render_profile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FONT_SETTINGS = {'size': 40, 'color': 'white', 'stroke_color': 'black', 'stroke_width': 2, 'family': 'Arial'}
+# Long enough for two chunks of RENDER_CHUNK_MIN_SECONDS
+CLIP_SECONDS = 12
+
+# Stands in for app.py run directly: records every import of itself, which a
+# spawn pool would repeat in each chunk process as __mp_main__
+DRIVER = """
+import os, sys
+with open("imports.log", "a") as f:
+    f.write(__name__ + "\\n")
+
+if __name__ == "__main__":
+    sys.path.insert(0, {root!r})
+    from utility.render.chunked_render import chunk_timeline, plan_chunks, render_chunked
+    from utility.render.profiles import get_render_profile
+    clip = {clip!r}
+    os.makedirs("work", exist_ok=True)
+    assert render_chunked("ffmpeg", "out.mp4", None, {duration}, [], [(0, {half}, clip), ({half}, {duration}, clip)],
+                          {font!r}, get_render_profile("draft"), "work", 2)
+"""
+
+
+@pytest.fixture(scope="module")
+def clip(tmp_path_factory):
+    return make_clip(str(tmp_path_factory.mktemp("footage") / "clip.mp4"), seconds=CLIP_SECONDS, width=640, height=360)
+
+
+def test_chunk_processes_do_not_import_the_main_module(tmp_path, clip):
+    script = tmp_path / "driver.py"
+    script.write_text(textwrap.dedent(DRIVER.format(root=REPO_ROOT, clip=clip, duration=2 * CLIP_SECONDS,
+                                                    half=CLIP_SECONDS, font=FONT_SETTINGS)))
+    env = dict(os.environ, CACHE_DIR=str(tmp_path / "cache"))
+    subprocess.run([sys.executable, str(script)], cwd=tmp_path, env=env, check=True, capture_output=True)
+
+    assert (tmp_path / "imports.log").read_text().split() == ["__main__"]
+    assert (tmp_path / "out.mp4").stat().st_size > 0
+    # Neither a task store nor caches were opened by the chunk processes
+    assert not (tmp_path / "tasks.db").exists()
+    assert not (tmp_path / "cache").exists()
+    assert os.listdir(tmp_path / "work") == []
+
+
+def test_failed_chunk_removes_chunk_files_and_concat_list(tmp_path, clip):
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    output = tmp_path / "out.mp4"
+    segments = [(0, CLIP_SECONDS, clip), (CLIP_SECONDS, 2 * CLIP_SECONDS, str(tmp_path / "missing.mp4"))]
+
+    with pytest.raises(subprocess.CalledProcessError):
+        render_chunked("ffmpeg", str(output), None, 2 * CLIP_SECONDS, [], segments, FONT_SETTINGS,
+                       get_render_profile("draft"), str(work_dir), 2)
+
+    assert os.listdir(work_dir) == []
+    assert not output.exists()
+
+
+def test_chunk_timeline_uses_frame_rounded_offsets_and_drops_slivers():
+    segments = [(0, 12.01, "a.mp4"), (12.01, 24, "b.mp4")]
+    windows = plan_chunks(24, segments, 2, 25, min_seconds=10)
+    assert windows == [(0.0, 12.0), (12.0, 24.0)]
+
+    first, _ = chunk_timeline(windows[0], segments, [], 25)
+    second, captions = chunk_timeline(windows[1], segments, [((12.2, 12.4), "text")], 25)
+    assert first == [(0.0, 12.0, "a.mp4")]
+    # The 0.01 s left of "a.mp4" after the cut is under one frame
+    assert second == [(0.0, 12.0, "b.mp4")]
+    assert captions == [((0.2, 0.4), "text")]
@@ -1,7 +1,36 @@
-import edge_tts
+from utility.tasks.cancellation import raise_if_cancelled
+from utility.metrics import timed_call
 
-async def generate_audio(text, output_filename, voice="en-AU-WilliamNeural"):
+# edge-tts reports offsets and durations in 100-nanosecond ticks
+TICKS_PER_SECOND = 10_000_000
+
+async def generate_audio(text, output_filename, voice="en-AU-WilliamNeural", cancel_token=None):
+    import edge_tts  # imported on first use to keep server start-up fast
     communicate = edge_tts.Communicate(text=text, voice=voice)
-    await communicate.save(output_filename)
+    with timed_call('edge_tts'), open(output_filename, "wb") as audio_file:
+        async for chunk in communicate.stream():
+            raise_if_cancelled(cancel_token)
+            if chunk["type"] == "audio":
+                audio_file.write(chunk["data"])
 
+async def generate_audio_with_word_boundaries(text, output_filename, voice="en-AU-WilliamNeural", cancel_token=None):
+    """Save the narration and return the WordBoundary events emitted while synthesizing it.
 
+    Each boundary is a dict with 'text', 'start' and 'end' in seconds.
+    """
+    import edge_tts  # imported on first use to keep server start-up fast
+    communicate = edge_tts.Communicate(text=text, voice=voice)
+    word_boundaries = []
+    with timed_call('edge_tts'), open(output_filename, "wb") as audio_file:
+        async for chunk in communicate.stream():
+            raise_if_cancelled(cancel_token)
+            if chunk["type"] == "audio":
+                audio_file.write(chunk["data"])
+            elif chunk["type"] == "WordBoundary":
+                start = chunk["offset"] / TICKS_PER_SECOND
+                word_boundaries.append({
+                    'text': chunk["text"],
+                    'start': start,
+                    'end': start + chunk["duration"] / TICKS_PER_SECOND
+                })
+    return word_boundaries
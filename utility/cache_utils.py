@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from utility.tasks.cancellation import raise_if_cancelled
+
+logger = logging.getLogger(__name__)
+
+# Directory holding the on-disk cache databases
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+# Seconds between cancellation checks while waiting for another thread's fetch
+FETCH_WAIT_INTERVAL = 0.5
+
+
+class TTLCache:
+    """Two-level cache for JSON-serializable values: an in-memory LRU in front of SQLite.
+
+    Entries expire ttl seconds after they are stored. The disk layer survives
+    restarts and is trimmed to max_disk_bytes, least recently used first.
+    """
+
+    def __init__(self, name, ttl, max_memory_entries=1024, max_disk_bytes=None, directory=CACHE_DIR):
+        self.name = name
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{name}.db")
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes_since_trim = 0
+        self._fetch_locks = {}  # key -> [lock, holders and waiters]
+        self.coalesced = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed_at ON cache (accessed_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key, expires_at, value):
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key, count_miss=True):
+        """Cached value for key, or None when missing or expired.
+
+        count_miss=False leaves a miss uncounted, for a first look before
+        fetch_lock whose second look inside the lock counts the lookup.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[1]
+                del self._memory[key]
+
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > now:
+                conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+                value = json.loads(row[0])
+                self._remember(key, row[1], value)
+                with self._lock:
+                    self.disk_hits += 1
+                return value
+            if row is not None:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.warning(f"{self.name} cache read failed: {str(e)}")
+
+        if count_miss:
+            with self._lock:
+                self.misses += 1
+        return None
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl
+        self._remember(key, expires_at, value)
+        try:
+            data = json.dumps(value)
+            self._connect().execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), expires_at, now))
+            self._writes_since_trim += 1
+            if self._writes_since_trim >= 100:
+                self._writes_since_trim = 0
+                self.trim()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"{self.name} cache write failed: {str(e)}")
+
+    @contextmanager
+    def fetch_lock(self, key, cancel_token=None):
+        """Hold while re-checking and filling a missing key.
+
+        Concurrent misses for the same key, such as one keyword searched by
+        several tasks of a batch, then wait for a single fetch and read its
+        result from the cache instead of fetching it again. Look up with
+        get(key, count_miss=False) before taking the lock and with get(key)
+        inside it, so each caller counts one hit or one miss.
+        """
+        with self._lock:
+            entry = self._fetch_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+            if entry[1] > 1:
+                self.coalesced += 1
+        try:
+            while not entry[0].acquire(timeout=FETCH_WAIT_INTERVAL):
+                raise_if_cancelled(cancel_token)
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._fetch_locks[key]
+
+    def trim(self):
+        """Drop expired rows and, past max_disk_bytes, the least recently used ones"""
+        conn = self._connect()
+        conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        if self.max_disk_bytes is None:
+            return
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM cache ORDER BY accessed_at").fetchall():
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'coalesced': self.coalesced,
+                'memory_entries': len(self._memory)
+            }
@@ -0,0 +1,99 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of Whisper models kept resident at once
+WHISPER_MAX_MODELS = int(os.getenv("WHISPER_MAX_MODELS", "1"))
+# Comma separated model sizes to load when the server starts, e.g. "base"
+WHISPER_WARMUP_MODELS = os.getenv("WHISPER_WARMUP_MODELS", "")
+
+
+class WhisperModelRegistry:
+    """Process-wide cache of loaded Whisper models keyed by model size, with LRU eviction"""
+
+    def __init__(self, max_models=WHISPER_MAX_MODELS):
+        self.max_models = max(1, max_models)
+        self._models = OrderedDict()  # model_size -> (model, use_lock)
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def _load(self, model_size):
+        from whisper_timestamped import load_model
+        logger.info(f"Loading Whisper model '{model_size}'")
+        return load_model(model_size)
+
+    def get(self, model_size="base"):
+        """Return (model, use_lock) for model_size, loading it on first use"""
+        with self._lock:
+            entry = self._models.get(model_size)
+            if entry is not None:
+                self._models.move_to_end(model_size)
+                return entry
+            load_lock = self._load_locks.setdefault(model_size, threading.Lock())
+
+        # Load outside the registry lock so other sizes stay available,
+        # but only once per size even if several tasks ask at the same time
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(model_size)
+                if entry is not None:
+                    self._models.move_to_end(model_size)
+                    return entry
+
+            entry = (self._load(model_size), threading.Lock())
+
+            with self._lock:
+                self._models[model_size] = entry
+                self._models.move_to_end(model_size)
+                while len(self._models) > self.max_models:
+                    evicted, _ = self._models.popitem(last=False)
+                    logger.info(f"Evicted Whisper model '{evicted}' from registry")
+            return entry
+
+    @contextmanager
+    def use(self, model_size="base"):
+        """Hold a loaded model exclusively for the duration of a transcription.
+
+        whisper_timestamped installs hooks on the model while transcribing, so
+        one model instance must not be used by two threads at the same time.
+        An evicted model stays alive until its current user releases it.
+        """
+        model, use_lock = self.get(model_size)
+        with use_lock:
+            yield model
+
+    def warm_up(self, model_sizes):
+        for model_size in model_sizes:
+            try:
+                self.get(model_size)
+            except Exception as e:
+                logger.error(f"Failed to warm up Whisper model '{model_size}': {str(e)}")
+
+    def loaded_models(self):
+        with self._lock:
+            return list(self._models.keys())
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+
+registry = WhisperModelRegistry()
+
+
+def warm_up_models(model_sizes=None, background=True):
+    """Preload Whisper models, by default those listed in WHISPER_WARMUP_MODELS"""
+    if model_sizes is None:
+        model_sizes = [s.strip() for s in WHISPER_WARMUP_MODELS.split(",") if s.strip()]
+    if not model_sizes:
+        return None
+    if not background:
+        registry.warm_up(model_sizes)
+        return None
+    thread = threading.Thread(target=registry.warm_up, args=(model_sizes,), daemon=True)
+    thread.start()
+    return thread
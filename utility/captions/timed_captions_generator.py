@@ -1,25 +1,52 @@
-import whisper_timestamped as whisper
-from whisper_timestamped import load_model, transcribe_timestamped
+from utility.captions.model_registry import registry
+from utility.tasks.cpu_budget import cpu_budget, set_torch_threads
+from utility.metrics import timed_call
 import re
+from bisect import bisect_left
 
-def generate_timed_captions(audio_filename,model_size="base"):
-    WHISPER_MODEL = load_model(model_size)
-   
-    gen = transcribe_timestamped(WHISPER_MODEL, audio_filename, verbose=False, fp16=False)
+def generate_timed_captions(audio_filename,model_size="base", cancel_token=None):
+    with registry.use(model_size) as WHISPER_MODEL, cpu_budget.allocate('whisper') as threads:
+        # torch's thread count is process-wide; the model's use lock keeps this transcription alone on it
+        set_torch_threads(threads)
+        # Check for cancellation before every decoder step, so a cancel stops
+        # the transcription within one token rather than at the end
+        hook = None
+        if cancel_token is not None:
+            hook = WHISPER_MODEL.decoder.register_forward_pre_hook(
+                lambda module, inputs: cancel_token.raise_if_cancelled())
+        try:
+            # Imported here: whisper_timestamped loads torch, which most tasks (TTS captions) never need
+            from whisper_timestamped import transcribe_timestamped
+            with timed_call('whisper'):
+                gen = transcribe_timestamped(WHISPER_MODEL, audio_filename, verbose=False, fp16=False)
+        finally:
+            if hook is not None:
+                hook.remove()
    
     return getCaptionsWithTime(gen)
 
+def generate_timed_captions_from_word_boundaries(word_boundaries):
+    """Build captions from edge-tts WordBoundary events instead of transcribing the audio"""
+    words = [{'text': b['text'], 'start': b['start'], 'end': b['end']}
+             for b in word_boundaries if b['text'].strip()]
+    analysis = {
+        'text': ' '.join(word['text'] for word in words),
+        'segments': [{'words': words}]
+    }
+    return getCaptionsWithTime(analysis)
+
 def splitWordsBySize(words, maxCaptionSize):
    
     halfCaptionSize = maxCaptionSize / 2
     captions = []
-    while words:
-        caption = words[0]
-        words = words[1:]
-        while words and len(caption + ' ' + words[0]) <= maxCaptionSize:
-            caption += ' ' + words[0]
-            words = words[1:]
-            if len(caption) >= halfCaptionSize and words:
+    i, count = 0, len(words)
+    while i < count:
+        caption = words[i]
+        i += 1
+        while i < count and len(caption) + 1 + len(words[i]) <= maxCaptionSize:
+            caption += ' ' + words[i]
+            i += 1
+            if len(caption) >= halfCaptionSize and i < count:
                 break
         captions.append(caption)
     return captions
@@ -35,9 +62,22 @@ def getTimestampMapping(whisper_analysis):
             index = newIndex
     return locationToTimestamp
 
+def getTimestampOffsets(whisper_analysis):
+    """Sorted end offsets of each word in the transcript and the matching word end times"""
+    index = 0
+    offsets, times = [], []
+    for segment in whisper_analysis['segments']:
+        for word in segment['words']:
+            index += len(word['text']) + 1
+            offsets.append(index)
+            times.append(word['end'])
+    return offsets, times
+
+CLEAN_WORD_PATTERN = re.compile(r'[^\w\s\-_"\'\']')
+
 def cleanWord(word):
    
-    return re.sub(r'[^\w\s\-_"\'\']', '', word)
+    return CLEAN_WORD_PATTERN.sub('', word)
 
 def interpolateTimeFromDict(word_position, d):
    
@@ -46,9 +86,16 @@ def interpolateTimeFromDict(word_position, d):
             return value
     return None
 
+def interpolateTimeFromOffsets(word_position, offsets, times):
+    """Same lookup as interpolateTimeFromDict, using bisect over the contiguous word spans"""
+    k = bisect_left(offsets, word_position)
+    if word_position < 0 or k == len(offsets):
+        return None
+    return times[k]
+
 def getCaptionsWithTime(whisper_analysis, maxCaptionSize=15, considerPunctuation=False):
    
-    wordLocationToTime = getTimestampMapping(whisper_analysis)
+    offsets, times = getTimestampOffsets(whisper_analysis)
     position = 0
     start_time = 0
     CaptionsPairs = []
@@ -63,7 +110,7 @@ def getCaptionsWithTime(whisper_analysis, maxCaptionSize=15, considerPunctuation
     
     for word in words:
         position += len(word) + 1
-        end_time = interpolateTimeFromDict(position, wordLocationToTime)
+        end_time = interpolateTimeFromOffsets(position, offsets, times)
         if end_time and word:
             CaptionsPairs.append(((start_time, end_time), word))
             start_time = end_time
@@ -0,0 +1,271 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import logging
+import requests
+from utility.cache_utils import TTLCache
+from utility.tasks.cancellation import raise_if_cancelled
+from utility.metrics import timed_call
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+# Set to 0 to always ask the model
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") == "1"
+# Responses are reused for this long; a prompt change changes the key anyway
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+# Read completions as a stream of chunks so malformed output is noticed early
+LLM_STREAM = os.getenv("LLM_STREAM", "1") == "1"
+# Seconds the readiness check waits for Ollama to answer
+OLLAMA_HEALTH_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "2"))
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Process-wide LLM response cache, created on first use"""
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = TTLCache("llm_responses", ttl=LLM_CACHE_TTL, max_disk_bytes=LLM_CACHE_MAX_BYTES)
+        return _llm_cache
+
+
+def llm_cache_key(payload):
+    """Hash of everything in a chat payload that affects the answer"""
+    relevant = {name: payload.get(name) for name in ('model', 'messages', 'format', 'options')}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def ollama_health(timeout=OLLAMA_HEALTH_TIMEOUT):
+    """(reachable, detail) from Ollama's /api/tags; never raises, so it can back a readiness check"""
+    try:
+        resp = requests.get(f"{OLLAMA_HOST}/api/tags", timeout=timeout)
+        resp.raise_for_status()
+        return True, {'models': [model.get('name') for model in resp.json().get('models', [])]}
+    except Exception as e:
+        return False, {'error': str(e)}
+
+
+class MalformedOutput(ValueError):
+    """Raised by an on_partial callback to stop a completion that can no longer be parsed"""
+
+
+def chat(payload, timeout=600, use_cache=True, cacheable=None, on_partial=None, cancel_token=None):
+    """Message content of an Ollama /api/chat call, answered from the cache when possible.
+
+    use_cache=False skips the lookup but still stores the fresh answer.
+    cacheable(content) decides whether an answer is worth keeping, so
+    malformed output is asked for again next time.
+    on_partial(content so far) is called as the completion streams in (once
+    with the whole answer on a cache hit); raising MalformedOutput from it
+    while streaming closes the connection and propagates. cancel_token is
+    checked between streamed chunks.
+    """
+    raise_if_cancelled(cancel_token)
+    key = llm_cache_key(payload) if LLM_CACHE_ENABLED else None
+    if not (key and use_cache):
+        return complete_chat(payload, timeout, key, cacheable, on_partial, cancel_token)
+
+    cached = cached_chat(key, payload, on_partial, count_miss=False)
+    if cached is not None:
+        return cached
+    # Identical prompts asked at once, such as a topic repeated in a batch,
+    # wait for one completion and take it from the cache
+    with get_llm_cache().fetch_lock(key, cancel_token):
+        cached = cached_chat(key, payload, on_partial)
+        if cached is not None:
+            return cached
+        return complete_chat(payload, timeout, key, cacheable, on_partial, cancel_token)
+
+
+def cached_chat(key, payload, on_partial=None, count_miss=True):
+    cached = get_llm_cache().get(key, count_miss)
+    if cached is not None:
+        logger.info(f"LLM cache hit for {payload.get('model')}")
+        if on_partial:
+            on_partial(cached)
+    return cached
+
+
+def complete_chat(payload, timeout, key, cacheable=None, on_partial=None, cancel_token=None):
+    """Ask Ollama and store the answer under key when there is one and it is cacheable"""
+    if LLM_STREAM and (on_partial or cancel_token):
+        with timed_call('ollama'):
+            content = stream_chat(payload, timeout, on_partial, cancel_token)
+    else:
+        with timed_call('ollama'):
+            resp = requests.post(f"{OLLAMA_HOST}/api/chat", json=dict(payload, stream=False), timeout=timeout)
+            resp.raise_for_status()
+            content = resp.json().get("message", {}).get("content", "")
+        if on_partial:
+            try:
+                on_partial(content)
+            except MalformedOutput:
+                pass  # the whole answer is here already; the caller's parser decides what to make of it
+
+    if key and content and (cacheable is None or cacheable(content)):
+        get_llm_cache().set(key, content)
+    return content
+
+
+def stream_chat(payload, timeout, on_partial=None, cancel_token=None):
+    """Read an Ollama chat completion as NDJSON chunks, calling on_partial after each one"""
+    parts = []
+    with requests.post(f"{OLLAMA_HOST}/api/chat", json=dict(payload, stream=True),
+                       timeout=timeout, stream=True) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            raise_if_cancelled(cancel_token)
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise ValueError(f"Ollama error: {chunk['error']}")
+            delta = chunk.get("message", {}).get("content", "")
+            if delta:
+                parts.append(delta)
+                if on_partial:
+                    on_partial("".join(parts))
+            if chunk.get("done"):
+                break
+    return "".join(parts)
+
+
+class SegmentStreamParser:
+    """Pulls complete [[t1, t2], [kw, ...]] elements out of a JSON array while it streams in.
+
+    The segment list is the first array in the output, so an object wrapper
+    like {"segments": [...]} works too. feed() raises MalformedOutput when
+    the text cannot turn into such a list.
+    """
+
+    # Characters allowed before the segment list starts
+    MAX_PREAMBLE = 512
+
+    def __init__(self, on_segment=None):
+        self.on_segment = on_segment
+        self.segments = []
+        self._pos = 0
+        self._depth = 0
+        self._list_depth = None
+        self._started = False
+        self._element_start = None
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text):
+        """Parse the new part of text (the whole completion so far); returns segments found in it"""
+        found = []
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if self._depth == 0 and not ch.isspace() and ch not in '[{':
+                if self._started:
+                    continue  # trailing text after the JSON value
+                raise MalformedOutput(f"Expected a JSON array or object, got {text[:80]!r}")
+            if ch == '"':
+                self._in_string = True
+            elif ch in '[{':
+                self._started = True
+                self._depth += 1
+                if self._list_depth is None and ch == '[':
+                    self._list_depth = self._depth
+                elif self._list_depth is not None and self._depth == self._list_depth + 1:
+                    self._element_start = i
+            elif ch in ']}':
+                self._depth -= 1
+                if self._list_depth is not None and self._depth == self._list_depth and self._element_start is not None:
+                    found.append(self._parse_element(text[self._element_start:i + 1]))
+                    self._element_start = None
+                elif self._depth < 0:
+                    raise MalformedOutput("Unbalanced brackets")
+        self._pos = len(text)
+        if self._list_depth is None and len(text) > self.MAX_PREAMBLE:
+            raise MalformedOutput("No segment list at the start of the output")
+        for segment in found:
+            self.segments.append(segment)
+            if self.on_segment:
+                self.on_segment(segment)
+        return found
+
+    @staticmethod
+    def _parse_element(element):
+        try:
+            segment = json.loads(element)
+        except json.JSONDecodeError:
+            raise MalformedOutput(f"Segment is not valid JSON: {element[:80]!r}")
+        if isinstance(segment, dict):
+            return segment
+        if (isinstance(segment, list) and len(segment) >= 2
+                and isinstance(segment[0], list) and isinstance(segment[1], list)):
+            return segment
+        raise MalformedOutput(f"Unexpected segment structure: {element[:80]!r}")
+
+
+class ScriptStreamParser:
+    """Decodes the "script" string of a {"script": "..."} answer while it streams in"""
+
+    MAX_PREAMBLE = 256
+    START_PATTERN = re.compile(r'^\s*\{\s*"script"\s*:\s*"')
+    ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self):
+        self.script = ""
+        self._start = None
+        self._pos = None
+        self.complete = False
+
+    def feed(self, text):
+        """Parse the new part of text; returns the script decoded so far"""
+        if self._start is None:
+            match = self.START_PATTERN.match(text)
+            if not match:
+                stripped = text.lstrip()
+                if (stripped and stripped[0] != '{') or len(text) > self.MAX_PREAMBLE:
+                    raise MalformedOutput(f"Expected {{\"script\": ...}}, got {text[:80]!r}")
+                return self.script
+            self._start = self._pos = match.end()
+
+        chars = []
+        i = self._pos
+        while i < len(text) and not self.complete:
+            ch = text[i]
+            if ch == '"':
+                self.complete = True
+                i += 1
+                break
+            if ch != '\\':
+                chars.append(ch)
+                i += 1
+                continue
+            if i + 1 >= len(text):
+                break  # escape split across chunks, wait for the rest
+            code = text[i + 1]
+            if code == 'u':
+                # \uXXXX, or a surrogate pair \uD83D\uDE00 spelling one character
+                width = 12 if text[i + 2:i + 3].lower() == 'd' and text[i + 3:i + 4].lower() in '89ab' else 6
+                if i + width > len(text):
+                    break
+                try:
+                    chars.append(json.loads(f'"{text[i:i + width]}"'))
+                except json.JSONDecodeError:
+                    raise MalformedOutput(f"Bad escape in script: {text[i:i + width]!r}")
+                i += width
+            else:
+                chars.append(self.ESCAPES.get(code, code))
+                i += 2
+        self._pos = i
+        self.script += "".join(chars)
+        return self.script
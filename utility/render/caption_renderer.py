@@ -0,0 +1,139 @@
+import os
+import re
+import threading
+import logging
+from collections import OrderedDict
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+# Rendered caption bitmaps kept in memory
+CAPTION_CACHE_SIZE = int(os.getenv("CAPTION_CACHE_SIZE", "512"))
+FONT_DIRS = [d for d in os.getenv("FONT_DIRS", "/usr/share/fonts:/usr/local/share/fonts:~/.fonts").split(":") if d]
+# Used when the requested family is not installed (fonts-dejavu ships in the Docker image)
+FALLBACK_FONTS = ("DejaVuSans.ttf", "DejaVuSans-Bold.ttf", "FreeSans.ttf")
+LINE_SPACING = 4
+
+
+def _normalize_font_name(name):
+    return re.sub(r'[^a-z0-9]', '', name.lower())
+
+
+@lru_cache(maxsize=1)
+def _font_index():
+    """Map of normalized font file names to paths under FONT_DIRS, built once"""
+    index = {}
+    for font_dir in FONT_DIRS:
+        for root, _, files in os.walk(os.path.expanduser(font_dir)):
+            for name in files:
+                stem, ext = os.path.splitext(name)
+                if ext.lower() in ('.ttf', '.otf', '.ttc'):
+                    index.setdefault(_normalize_font_name(stem), os.path.join(root, name))
+    return index
+
+
+@lru_cache(maxsize=64)
+def load_font(family, size):
+    """Loaded font object for (family, size); family may be a name like 'Arial' or a file path"""
+    size = max(1, int(round(size)))
+    candidates = [family]
+    path = _font_index().get(_normalize_font_name(family))
+    if path:
+        candidates.append(path)
+    for fallback in FALLBACK_FONTS:
+        candidates.append(_font_index().get(_normalize_font_name(os.path.splitext(fallback)[0]), fallback))
+    for candidate in candidates:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except (OSError, ValueError):
+            continue
+    logger.warning(f"No TrueType font found for '{family}', using Pillow's default font")
+    return ImageFont.load_default(size=size)
+
+
+def wrap_text(text, font, max_width, stroke_width=0):
+    """Greedy word wrap so no line is wider than max_width pixels"""
+    lines = []
+    for paragraph in text.split('\n'):
+        line = ''
+        for word in paragraph.split():
+            candidate = f"{line} {word}" if line else word
+            if not line or font.getlength(candidate) + 2 * stroke_width <= max_width:
+                line = candidate
+            else:
+                lines.append(line)
+                line = word
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def _render(text, family, size, color, stroke_color, stroke_width, width):
+    font = load_font(family, size)
+    stroke_width = int(round(stroke_width or 0))
+    wrapped = wrap_text(text, font, width, stroke_width)
+
+    measure = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+    left, top, right, bottom = measure.multiline_textbbox(
+        (0, 0), wrapped, font=font, spacing=LINE_SPACING, align='center', stroke_width=stroke_width)
+    height = max(1, bottom - top)
+
+    image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    x = (width - (right - left)) / 2 - left
+    draw.multiline_text(
+        (x, -top), wrapped, font=font, fill=color, spacing=LINE_SPACING, align='center',
+        stroke_width=stroke_width, stroke_fill=stroke_color if stroke_width else None)
+    import numpy as np  # imported on first render to keep server start-up fast
+    return np.asarray(image)
+
+
+class CaptionRenderer:
+    """Renders captions in-process with Pillow and keeps recent bitmaps in an LRU cache"""
+
+    def __init__(self, max_entries=CAPTION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._bitmaps = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, font_settings, width):
+        """RGBA uint8 array (height x width x 4) with the caption centered; treat it as read-only"""
+        key = (
+            text,
+            font_settings['family'],
+            float(font_settings['size']),
+            font_settings['color'],
+            font_settings['stroke_color'],
+            font_settings['stroke_width'],
+            width
+        )
+        with self._lock:
+            bitmap = self._bitmaps.get(key)
+            if bitmap is not None:
+                self._bitmaps.move_to_end(key)
+                self.hits += 1
+                return bitmap
+            self.misses += 1
+
+        bitmap = _render(text, *key[1:])
+        bitmap.flags.writeable = False
+        with self._lock:
+            self._bitmaps[key] = bitmap
+            while len(self._bitmaps) > self.max_entries:
+                self._bitmaps.popitem(last=False)
+        return bitmap
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._bitmaps)
+            }
+
+
+caption_renderer = CaptionRenderer()
@@ -0,0 +1,41 @@
+"""
+Renders one chunk of a chunked render in its own process:
+
+    python chunk_worker.py <job.json>
+
+Started by render_chunked as a fresh interpreter that imports only the
+renderer, so chunk processes never load the API module, its task store,
+metrics or pipeline. SIGTERM (sent by run_process when the task is
+cancelled or a sibling chunk failed) stops the encode and its ffmpeg child.
+"""
+import os
+import sys
+import json
+import signal
+
+
+def render_chunk(job, cancel_token=None):
+    from utility.render import render_engine
+    os.makedirs(job['work_dir'], exist_ok=True)
+    if job['backend'] == 'ffmpeg':
+        render_engine.render_ffmpeg(job['output_file'], None, job['timed_captions'], job['segments'],
+                                    job['font_settings'], job['work_dir'], job['profile'],
+                                    duration=job['duration'], threads=job['threads'], cancel_token=cancel_token)
+    else:
+        render_engine.render_moviepy(job['output_file'], None, job['timed_captions'], job['segments'],
+                                     job['font_settings'], job['profile'],
+                                     duration=job['duration'], threads=job['threads'], cancel_token=cancel_token)
+
+
+def main(job_path):
+    from utility.tasks.cancellation import CancellationToken
+    cancel_token = CancellationToken()
+    signal.signal(signal.SIGTERM, lambda signum, frame: cancel_token.cancel())
+    with open(job_path) as f:
+        render_chunk(json.load(f), cancel_token)
+
+
+if __name__ == "__main__":
+    # Run as a script: import from the repository root, not from this directory
+    sys.path[0] = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main(sys.argv[1])
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import math
+import shutil
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utility.tasks.cancellation import CancellationToken, run_process
+from utility.render import chunk_worker
+from utility.render.ffmpeg_backend import ffmpeg_binary
+
+logger = logging.getLogger(__name__)
+
+# Chunks rendered in parallel for one video; 1 renders the timeline in one piece
+RENDER_CHUNKS = int(os.getenv("RENDER_CHUNKS", "1"))
+# Chunks shorter than this cost more in process start-up than they save
+RENDER_CHUNK_MIN_SECONDS = float(os.getenv("RENDER_CHUNK_MIN_SECONDS", "10"))
+
+
+def plan_chunks(duration, segments, chunk_count, fps, min_seconds=RENDER_CHUNK_MIN_SECONDS):
+    """Split [0, duration] into up to chunk_count (start, end) windows.
+
+    Windows are cut at segment boundaries closest to an even split, and every
+    boundary sits on the frame grid so the chunks join without gaps or
+    duplicated frames.
+    """
+    total_frames = max(1, math.ceil(duration * fps - 1e-6))
+    chunk_count = max(1, min(chunk_count, int(duration // max(min_seconds, 1e-6)) or 1))
+    min_frames = min_seconds * fps
+    candidates = sorted(frame for frame in {round(t * fps) for start, end, _ in segments for t in (start, end)}
+                        if min_frames <= frame <= total_frames - min_frames)
+
+    cuts = []
+    for k in range(1, chunk_count):
+        target = total_frames * k / chunk_count
+        remaining = [frame for frame in candidates if not cuts or frame > cuts[-1]]
+        if not remaining:
+            break
+        cut = min(remaining, key=lambda frame: abs(frame - target))
+        if cut - (cuts[-1] if cuts else 0) >= min_frames:
+            cuts.append(cut)
+
+    frames = [0] + cuts + [total_frames]
+    return [(frames[i] / fps, frames[i + 1] / fps) for i in range(len(frames) - 1)]
+
+
+def chunk_timeline(window, segments, timed_captions, fps):
+    """Segments and captions overlapping window, shifted to start at 0.
+
+    Times are rounded to the same frame grid as the window, so every offset
+    is measured from the frame the chunk starts on; pieces shorter than one
+    frame, left where a boundary was rounded to a nearby cut, are dropped.
+    """
+    start, end = window
+    start_frame, end_frame = round(start * fps), round(end * fps)
+
+    def clip(t1, t2):
+        f1 = start_frame if t1 <= start else round(t1 * fps)
+        f2 = end_frame if t2 >= end else min(round(t2 * fps), end_frame)
+        return ((f1 - start_frame) / fps, (f2 - start_frame) / fps) if f2 > f1 else None
+
+    chunk_segments = [times + (path,) for times, path in
+                      ((clip(t1, t2), path) for t1, t2, path in segments if t1 < end and t2 > start) if times]
+    chunk_captions = [(times, text) for times, text in
+                      ((clip(t1, t2), text) for (t1, t2), text in timed_captions if t1 < end and t2 > start) if times]
+    return chunk_segments, chunk_captions
+
+
+def render_chunk_process(job, job_path, cancel_token=None):
+    """Render one chunk in a chunk_worker process, killed when cancel_token is cancelled"""
+    with open(job_path, "w") as f:
+        json.dump(job, f)
+    run_process([sys.executable, chunk_worker.__file__, job_path], cancel_token, process_group=True)
+    return job['output_file']
+
+
+def concat_chunks(chunk_files, output_file, audio_file_path, duration, work_dir, cancel_token=None):
+    """Join video-only chunks with the concat demuxer (no re-encode) and mux the narration once"""
+    list_path = os.path.join(work_dir, "chunks.txt")
+    with open(list_path, "w") as f:
+        for path in chunk_files:
+            f.write("file '{}'\n".format(os.path.abspath(path).replace("'", "'\\''")))
+
+    command = [ffmpeg_binary(), '-y', '-loglevel', 'error',
+               '-f', 'concat', '-safe', '0', '-i', list_path]
+    if audio_file_path:
+        command += ['-i', audio_file_path, '-map', '0:v', '-map', '1:a', '-c:a', 'aac']
+    command += ['-c:v', 'copy', '-t', f"{duration:.3f}", '-movflags', '+faststart', output_file]
+    run_process(command, cancel_token)
+    return output_file
+
+
+def render_chunked(backend, output_file, audio_file_path, duration, timed_captions, segments,
+                   font_settings, profile, work_dir, chunk_count, total_threads=None, cancel_token=None,
+                   on_progress=None):
+    """Render the timeline as parallel chunks, one worker process each, and join them.
+
+    total_threads encoder threads are split evenly between the chunks.
+    on_progress(seconds rendered, duration) is called as each chunk finishes.
+
+    Returns False without rendering when the timeline is too short to split,
+    so the caller can render it in one piece.
+    """
+    windows = plan_chunks(duration, segments, chunk_count, profile['fps'])
+    if len(windows) < 2:
+        return False
+    threads = max(1, (total_threads or os.cpu_count() or 1) // len(windows))
+
+    logger.info(f"Rendering {output_file} in {len(windows)} chunks with {backend}")
+    # Chunks run as separate interpreters that import only the renderer (see
+    # chunk_worker). A failed chunk cancels its siblings, as does the task.
+    chunk_token = CancellationToken()
+    if cancel_token is not None:
+        cancel_token.on_cancel(chunk_token.cancel)
+    chunk_files, chunk_paths = [], [os.path.join(work_dir, "chunks.txt")]
+    try:
+        with ThreadPoolExecutor(max_workers=len(windows), thread_name_prefix="render-chunk") as pool:
+            futures = {}
+            for i, window in enumerate(windows):
+                chunk_segments, chunk_captions = chunk_timeline(window, segments, timed_captions, profile['fps'])
+                chunk_file = os.path.join(work_dir, f"chunk_{i:03d}.mp4")
+                job = {
+                    'backend': backend,
+                    'output_file': chunk_file,
+                    'duration': window[1] - window[0],
+                    'segments': chunk_segments,
+                    'timed_captions': chunk_captions,
+                    'font_settings': font_settings,
+                    'profile': profile,
+                    'work_dir': os.path.join(work_dir, f"chunk_{i:03d}"),
+                    'threads': threads
+                }
+                chunk_files.append(chunk_file)
+                chunk_paths += [chunk_file, job['work_dir'], job['work_dir'] + ".json"]
+                future = pool.submit(render_chunk_process, job, job['work_dir'] + ".json", chunk_token)
+                futures[future] = job['duration']
+            rendered = 0
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    rendered += futures[future]
+                    if on_progress:
+                        on_progress(rendered, duration)
+            except BaseException:
+                chunk_token.cancel()
+                raise
+
+        concat_chunks(chunk_files, output_file, audio_file_path, duration, work_dir, cancel_token)
+    finally:
+        if cancel_token is not None:
+            cancel_token.remove_callback(chunk_token.cancel)
+        # Chunks, their job files and the concat list are only needed until the join
+        for path in chunk_paths:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+    return True
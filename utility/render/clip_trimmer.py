@@ -0,0 +1,62 @@
+import os
+import logging
+from utility.tasks.cancellation import run_process
+from utility.render.ffmpeg_backend import ffmpeg_binary
+
+logger = logging.getLogger(__name__)
+
+# Preset used when a clip has to be re-encoded to match the output profile
+TRIM_PRESET = os.getenv("TRIM_PRESET", "veryfast")
+
+
+def probe_clip(path):
+    """Return (width, height, fps, duration) of a video file"""
+    # Imported here: the reader module pulls in numpy and imageio
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+    infos = ffmpeg_parse_infos(path)
+    width, height = infos.get('video_size') or (0, 0)
+    return width, height, infos.get('video_fps') or 0, infos.get('duration') or 0
+
+
+def trim_clip(source_path, output_path, duration, width, height, fps, start=0, threads=None, cancel_token=None):
+    """Cut [start, start + duration] out of source_path with ffmpeg, matching the output profile.
+
+    The stream is copied when the cut starts on the first keyframe and the
+    source already has the target size and frame rate; otherwise it is
+    re-encoded scaled, cropped and resampled to width x height at fps.
+    Sources shorter than the cut are looped. Audio is dropped. threads caps
+    the encoder threads (ffmpeg's default is one per core).
+    """
+    src_width, src_height, src_fps, src_duration = probe_clip(source_path)
+    ffmpeg = ffmpeg_binary()
+    long_enough = src_duration >= start + duration
+    matches_profile = (src_width, src_height) == (width, height) and abs(src_fps - fps) < 0.01
+
+    if start == 0 and long_enough and matches_profile:
+        command = [
+            ffmpeg, '-y', '-loglevel', 'error',
+            '-i', source_path,
+            '-t', f"{duration:.3f}",
+            '-map', '0:v:0', '-an', '-c:v', 'copy',
+            output_path
+        ]
+    else:
+        command = [ffmpeg, '-y', '-loglevel', 'error']
+        if not long_enough:
+            command += ['-stream_loop', '-1']
+        command += [
+            # Input seeking: ffmpeg jumps to the nearest keyframe instead of decoding from the start
+            '-ss', f"{start:.3f}",
+            '-i', source_path,
+            '-t', f"{duration:.3f}",
+            '-map', '0:v:0', '-an',
+            '-vf', (f"scale={width}:{height}:force_original_aspect_ratio=increase,"
+                    f"crop={width}:{height},fps={fps},setsar=1"),
+            '-c:v', 'libx264', '-preset', TRIM_PRESET, '-crf', '18', '-pix_fmt', 'yuv420p'
+        ]
+        if threads:
+            command += ['-threads', str(threads)]
+        command.append(output_path)
+
+    run_process(command, cancel_token)
+    return output_path
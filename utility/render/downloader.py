@@ -0,0 +1,66 @@
+import os
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from utility.tasks.cancellation import raise_if_cancelled
+from utility.metrics import timed_call, DOWNLOADED_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Number of clips fetched at the same time for one render
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "4"))
+DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", "30"))
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+# Keep-alive connections kept per host across renders
+DOWNLOAD_POOL_SIZE = int(os.getenv("DOWNLOAD_POOL_SIZE", "16"))
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Shared requests session so clip downloads reuse pooled keep-alive connections"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=DOWNLOAD_POOL_SIZE, pool_maxsize=DOWNLOAD_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(HEADERS)
+            _session = session
+        return _session
+
+
+def stream_to_file(url, filename, max_bytes=None, cancel_token=None, on_progress=None):
+    """Stream url to filename in chunks, stopping after max_bytes if given. Returns bytes written.
+
+    cancel_token is checked between chunks. on_progress(written, total) is
+    called after each chunk; total is None when the server sends no length.
+    """
+    headers = {"Range": f"bytes=0-{max_bytes - 1}"} if max_bytes else None
+    written = 0
+    with timed_call('clip_download'), \
+            get_session().get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        response.raise_for_status()
+        total = int(response.headers.get("Content-Length") or 0) or None
+        if max_bytes and total:
+            total = min(total, max_bytes)
+        with open(filename, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                raise_if_cancelled(cancel_token)
+                if max_bytes and written + len(chunk) > max_bytes:
+                    chunk = chunk[:max_bytes - written]
+                f.write(chunk)
+                written += len(chunk)
+                DOWNLOADED_BYTES.inc(len(chunk))
+                if on_progress:
+                    on_progress(written, total)
+                if max_bytes and written >= max_bytes:
+                    break
+    return written
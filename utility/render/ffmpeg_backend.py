@@ -0,0 +1,96 @@
+import logging
+from utility.tasks.cancellation import run_process
+
+logger = logging.getLogger(__name__)
+
+
+def ffmpeg_binary():
+    """The ffmpeg executable MoviePy is configured with; moviepy.config loads numpy, so it is imported on use"""
+    from moviepy.config import get_setting
+    return get_setting("FFMPEG_BINARY")
+
+
+def build_filtergraph(segments, captions, duration, width, height, fps, first_segment_input, first_caption_input):
+    """Filtergraph overlaying background segments and caption images on a black canvas.
+
+    segments: list of (start, end) for the video inputs starting at first_segment_input
+    captions: list of (start, end, y) for the image inputs starting at first_caption_input
+    """
+    filters = [f"color=c=black:s={width}x{height}:r={fps}:d={duration:.3f}[base]"]
+    current = "base"
+
+    for i, (start, end) in enumerate(segments):
+        index = first_segment_input + i
+        filters.append(
+            f"[{index}:v]fps={fps},scale={width}:{height}:force_original_aspect_ratio=increase,"
+            f"crop={width}:{height},setsar=1,trim=duration={end - start:.3f},"
+            f"setpts=PTS-STARTPTS+{start:.3f}/TB[seg{i}]")
+        filters.append(
+            f"[{current}][seg{i}]overlay=eof_action=pass:enable='between(t,{start:.3f},{end:.3f})'[bg{i}]")
+        current = f"bg{i}"
+
+    for i, (start, end, y) in enumerate(captions):
+        index = first_caption_input + i
+        filters.append(
+            f"[{current}][{index}:v]overlay=x=(W-w)/2:y={y}:enable='between(t,{start:.3f},{end:.3f})'[cap{i}]")
+        current = f"cap{i}"
+
+    filters.append(f"[{current}]format=yuv420p[vout]")
+    return ";".join(filters)
+
+
+def render_with_ffmpeg(output_file, duration, segments, captions, audio_file_path=None,
+                       width=1920, height=1080, fps=24, preset='fast', threads=4, cancel_token=None,
+                       on_progress=None):
+    """Assemble the final video in a single ffmpeg process.
+
+    segments: list of (start, end, clip_path) placed on the timeline at start
+    captions: list of (start, end, png_path, y) RGBA caption images, horizontally centered
+    on_progress(seconds encoded, duration) is fed from ffmpeg's -progress output
+    """
+    ffmpeg = ffmpeg_binary()
+    command = [ffmpeg, '-y', '-loglevel', 'error']
+    input_count = 0
+    if audio_file_path:
+        command += ['-i', audio_file_path]
+        input_count += 1
+    first_segment_input = input_count
+    for _, _, clip_path in segments:
+        command += ['-i', clip_path]
+        input_count += 1
+    first_caption_input = input_count
+    for _, _, image_path, _ in captions:
+        command += ['-i', image_path]
+        input_count += 1
+
+    filtergraph = build_filtergraph(
+        [(start, end) for start, end, _ in segments],
+        [(start, end, y) for start, end, _, y in captions],
+        duration, width, height, fps, first_segment_input, first_caption_input
+    )
+    command += ['-filter_complex', filtergraph, '-map', '[vout]']
+    if audio_file_path:
+        command += ['-map', '0:a', '-c:a', 'aac']
+    command += [
+        '-c:v', 'libx264', '-preset', preset, '-threads', str(threads),
+        '-r', str(fps), '-t', f"{duration:.3f}",
+    ]
+    on_output_line = None
+    if on_progress:
+        command += ['-progress', 'pipe:1', '-nostats']
+        on_output_line = lambda line: parse_progress_line(line, duration, on_progress)
+    command.append(output_file)
+
+    logger.info(f"Rendering {output_file} with ffmpeg ({len(segments)} segments, {len(captions)} captions)")
+    run_process(command, cancel_token, on_output_line=on_output_line)
+    return output_file
+
+
+def parse_progress_line(line, duration, on_progress):
+    """Report the position from one key=value line of ffmpeg -progress output"""
+    key, _, value = line.partition('=')
+    # out_time_ms is in microseconds too, despite its name
+    if key in ('out_time_us', 'out_time_ms') and value.strip().isdigit():
+        on_progress(min(int(value) / 1e6, duration), duration)
+    elif key == 'progress' and value == 'end':
+        on_progress(duration, duration)
@@ -0,0 +1,195 @@
+import os
+import re
+import hashlib
+import tempfile
+import threading
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "media_cache"))
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+
+# https://videos.pexels.com/video-files/3571264/3571264-uhd_2560_1440_30fps.mp4
+PEXELS_FILE_PATTERN = re.compile(r'/video-files/(\d+)/([^/?#]+?)(\.\w+)?(?:[?#]|$)')
+# https://player.vimeo.com/external/342571552.hd.mp4?s=...&profile_id=175
+VIMEO_FILE_PATTERN = re.compile(r'/external/(\d+)\.(\w+)(\.\w+)?\?(?:.*&)?profile_id=(\d+)')
+
+
+def media_key(url):
+    """Cache key for a footage URL: Pexels video id and rendition when recognisable, else a URL hash"""
+    match = PEXELS_FILE_PATTERN.search(url)
+    if match:
+        video_id, rendition, ext = match.group(1), match.group(2), match.group(3) or '.mp4'
+        return f"pexels-{video_id}-{re.sub(r'[^A-Za-z0-9_.-]', '_', rendition)}{ext}"
+    match = VIMEO_FILE_PATTERN.search(url)
+    if match:
+        video_id, quality, ext, profile = match.groups()
+        return f"vimeo-{video_id}-{quality}-{profile}{ext or '.mp4'}"
+    return f"url-{hashlib.sha256(url.encode()).hexdigest()[:32]}.mp4"
+
+
+class MediaCache:
+    """On-disk footage cache with a byte budget and LRU eviction.
+
+    Files are written to a temporary name and renamed into place, so readers
+    never see a partial download. Entries pinned by a render in progress are
+    never evicted.
+    """
+
+    def __init__(self, directory=MEDIA_CACHE_DIR, max_bytes=MEDIA_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._pins = {}
+        self._fetch_locks = {}  # key -> [lock, holders and waiters]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted_bytes = 0
+        self.evicted_files = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('.tmp-'):
+                # Left behind by an interrupted download
+                os.remove(path)
+            elif os.path.isfile(path):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key)
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(self._entries.values())
+
+    def acquire(self, url, fetch, variant=None):
+        """Return (key, local path) for url and pin it, calling fetch(url, path) on a miss.
+
+        variant distinguishes different downloads of the same URL, such as a
+        truncated head of the file. Callers must release(key) once they no
+        longer read the file.
+        """
+        key = media_key(url)
+        if variant:
+            stem, ext = os.path.splitext(key)
+            key = f"{stem}-{variant}{ext}"
+        path = self.path_for(key)
+        with self._lock:
+            self._pins[key] = self._pins.get(key, 0) + 1
+
+        try:
+            # Concurrent renders asking for the same clip wait for one download
+            with self._fetch_lock(key):
+                with self._lock:
+                    if key in self._entries and os.path.exists(path):
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        hit = True
+                    else:
+                        self._entries.pop(key, None)
+                        self.misses += 1
+                        hit = False
+                if hit:
+                    os.utime(path)
+                else:
+                    self._fetch(url, path, fetch)
+                    with self._lock:
+                        self._entries[key] = os.path.getsize(path)
+                        self._entries.move_to_end(key)
+                    self._evict()
+        except Exception:
+            self.release(key)
+            raise
+        return key, path
+
+    @contextmanager
+    def _fetch_lock(self, key):
+        """Hold while checking and filling key; the lock is dropped once nobody holds or waits for it"""
+        with self._lock:
+            entry = self._fetch_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._fetch_locks[key]
+
+    def release(self, key):
+        with self._lock:
+            remaining = self._pins.get(key, 0) - 1
+            if remaining > 0:
+                self._pins[key] = remaining
+            else:
+                self._pins.pop(key, None)
+
+    def _fetch(self, url, path, fetch):
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=self.directory)
+        os.close(fd)
+        try:
+            fetch(url, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _evict(self):
+        with self._lock:
+            total = sum(self._entries.values())
+            victims = []
+            for key, size in self._entries.items():
+                if total <= self.max_bytes:
+                    break
+                if self._pins.get(key):
+                    continue
+                victims.append(key)
+                total -= size
+            for key in victims:
+                size = self._entries.pop(key)
+                self.evicted_bytes += size
+                self.evicted_files += 1
+                try:
+                    os.remove(self.path_for(key))
+                except OSError as e:
+                    logger.warning(f"Failed to remove cached media {key}: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evicted_bytes': self.evicted_bytes,
+                'evicted_files': self.evicted_files,
+                'files': len(self._entries),
+                'bytes': sum(self._entries.values()),
+                'max_bytes': self.max_bytes
+            }
+
+
+_media_cache = None
+_media_cache_lock = threading.Lock()
+
+
+def get_media_cache():
+    """Process-wide MediaCache, created on first use"""
+    global _media_cache
+    with _media_cache_lock:
+        if _media_cache is None:
+            _media_cache = MediaCache()
+        return _media_cache
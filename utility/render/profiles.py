@@ -0,0 +1,49 @@
+import os
+
+# Named output settings. "final" is the full quality render, "draft" a quick
+# preview to check the script and footage choice before paying for "final".
+RENDER_PROFILES = {
+    'final': {
+        'width': 1920,
+        'height': 1080,
+        'fps': 24,
+        'preset': 'fast',
+        # Width of the Pexels rendition downloaded for each segment
+        'footage_width': 1920
+    },
+    'draft': {
+        'width': 640,
+        'height': 360,
+        'fps': 12,
+        'preset': 'ultrafast',
+        'footage_width': 640
+    }
+}
+DEFAULT_RENDER_PROFILE = os.getenv("RENDER_PROFILE", "final")
+# Captions are designed for a 1080 line frame and scaled for other heights
+REFERENCE_HEIGHT = 1080
+CAPTION_Y = 800
+
+
+def get_render_profile(name=None):
+    """Copy of the named profile with its name; raises ValueError for unknown names"""
+    name = name or DEFAULT_RENDER_PROFILE
+    if name not in RENDER_PROFILES:
+        raise ValueError(f"Unknown render profile '{name}', expected one of {list(RENDER_PROFILES)}")
+    return dict(RENDER_PROFILES[name], name=name)
+
+
+def scale_font_settings(font_settings, profile):
+    """Font settings scaled from the 1080 line design to the profile's height"""
+    scale = profile['height'] / REFERENCE_HEIGHT
+    if scale == 1:
+        return font_settings
+    return dict(
+        font_settings,
+        size=font_settings['size'] * scale,
+        stroke_width=max(1, round(font_settings['stroke_width'] * scale)) if font_settings['stroke_width'] else 0
+    )
+
+
+def caption_y(profile):
+    return round(CAPTION_Y * profile['height'] / REFERENCE_HEIGHT)
@@ -1,27 +1,166 @@
 import time
+import threading
 import os
 import tempfile
+import shutil
 import zipfile
 import platform
 import subprocess
 from datetime import datetime
-from moviepy.editor import (AudioFileClip, CompositeVideoClip, CompositeAudioClip, ImageClip,
-                            TextClip, VideoFileClip)
-from moviepy.audio.fx.audio_loop import audio_loop
-from moviepy.audio.fx.audio_normalize import audio_normalize
+from functools import lru_cache
 import requests
 import random
+from concurrent.futures import ThreadPoolExecutor
+from utility.render.media_cache import get_media_cache
+from utility.render.downloader import stream_to_file, DOWNLOAD_CONCURRENCY
+from utility.render.clip_trimmer import trim_clip, probe_clip
+from utility.render.ffmpeg_backend import render_with_ffmpeg
+from utility.render.caption_renderer import caption_renderer
+from utility.render.profiles import get_render_profile, scale_font_settings, caption_y
+from utility.render.chunked_render import render_chunked, RENDER_CHUNKS
+from utility.tasks.cpu_budget import cpu_budget
+from utility.tasks.cancellation import TaskCancelled, raise_if_cancelled
+from utility.metrics import registry
+from proglog import TqdmProgressBarLogger
+from PIL import Image
 
-from moviepy.config import change_settings
-change_settings({"IMAGEMAGICK_BINARY": "/usr/bin/convert"})
+IMAGEMAGICK_BINARY = "/usr/bin/convert"
 
-def download_file(url, filename):
-    with open(filename, 'wb') as f:
-        headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        response = requests.get(url, headers=headers)
-        f.write(response.content)
+# "moviepy" composites frames in Python, "ffmpeg" builds one native filtergraph
+RENDER_BACKENDS = ('moviepy', 'ffmpeg')
+RENDER_BACKEND = os.getenv("RENDER_BACKEND", "moviepy")
+# Cut each clip to its segment with ffmpeg before MoviePy opens it
+PRETRIM_CLIPS = os.getenv("PRETRIM_CLIPS", "1") == "1"
+
+# Download only the head of each clip that the segment needs instead of the whole file
+PARTIAL_DOWNLOADS = os.getenv("PARTIAL_DOWNLOADS", "0") == "1"
+# Assumed upper bound on stock footage bitrate, used to size partial downloads
+PARTIAL_DOWNLOAD_BYTES_PER_SECOND = int(os.getenv("PARTIAL_DOWNLOAD_BYTES_PER_SECOND", str(3 * 1024 * 1024)))
+PARTIAL_DOWNLOAD_MIN_BYTES = 8 * 1024 * 1024
+
+ENCODE_SECONDS = registry.histogram(
+    'render_encode_seconds', 'Wall time of the encode step of a render', ('backend', 'profile'))
+ENCODE_FPS = registry.histogram(
+    'render_encode_fps', 'Output frames encoded per second of wall time', ('backend', 'profile'),
+    buckets=(1, 2, 5, 10, 15, 24, 30, 48, 60, 120, 240, 480))
+
+@lru_cache(maxsize=1)
+def moviepy_editor():
+    """moviepy.editor, imported and configured on first use; it pulls in numpy, imageio and scipy"""
+    from moviepy.config import change_settings
+    import moviepy.editor as editor
+    change_settings({"IMAGEMAGICK_BINARY": IMAGEMAGICK_BINARY})
+    return editor
+
+def download_file(url, filename, max_bytes=None, cancel_token=None, on_progress=None):
+    stream_to_file(url, filename, max_bytes=max_bytes, cancel_token=cancel_token, on_progress=on_progress)
+
+class TaskBarLogger(TqdmProgressBarLogger):
+    """MoviePy's progress bar logger that also reports frames to on_progress(frames, total)
+    and stops the encode once cancel_token is cancelled"""
+
+    def __init__(self, cancel_token=None, on_progress=None):
+        super().__init__()
+        self.cancel_token = cancel_token
+        self.on_progress = on_progress
+
+    def bars_callback(self, bar, attr, value, old_value=None):
+        # Called for every frame written ("t") and audio chunk ("chunk")
+        raise_if_cancelled(self.cancel_token)
+        if self.on_progress and bar == 't' and attr == 'index':
+            self.on_progress(value, self.bars[bar]['total'])
+        super().bars_callback(bar, attr, value, old_value)
+
+class DownloadProgress:
+    """Aggregates byte progress of the concurrent clip downloads of one render"""
+
+    def __init__(self, clip_count, on_progress):
+        self.clip_count = clip_count
+        self.on_progress = on_progress
+        self._fractions = {}
+        self._bytes = {}
+        self._lock = threading.Lock()
+
+    def update(self, index, written, total):
+        with self._lock:
+            self._bytes[index] = written
+            self._fractions[index] = min(written / total, 1.0) if total else self._fractions.get(index, 0)
+            done, downloaded = sum(self._fractions.values()), sum(self._bytes.values())
+        self.on_progress(done, self.clip_count, bytes=downloaded)
+
+    def finish(self, index):
+        with self._lock:
+            self._fractions[index] = 1.0
+            done, downloaded = sum(self._fractions.values()), sum(self._bytes.values())
+        self.on_progress(done, self.clip_count, bytes=downloaded)
+
+def prepare_background_clips(media_cache, background_video_data, work_dir, profile=None, threads=None,
+                             cancel_token=None, on_progress=None):
+    """Download and pre-trim all segment clips concurrently.
+
+    Returns (cache keys to release, clip path or None) for every segment.
+    threads is shared between the concurrent trims. Once cancel_token is
+    cancelled the remaining segments come back as None. on_progress(clips
+    done, clip count, bytes=downloaded) counts partially downloaded clips
+    by the fraction of their bytes received.
+    """
+    profile = profile or get_render_profile()
+    trim_threads = max(1, threads // DOWNLOAD_CONCURRENCY) if threads else None
+    progress = DownloadProgress(len(background_video_data), on_progress) if on_progress else None
+
+    def fetcher(index, max_bytes=None):
+        report = (lambda written, total: progress.update(index, written, total)) if progress else None
+        return lambda url, filename: download_file(url, filename, max_bytes, cancel_token, report)
+
+    def pretrim(clip_path, index, duration):
+        if not PRETRIM_CLIPS:
+            # Still make sure the file is readable before handing it to MoviePy
+            probe_clip(clip_path)
+            return clip_path
+        output_path = os.path.join(work_dir, f"segment_{index:03d}.mp4")
+        return trim_clip(clip_path, output_path, duration, profile['width'], profile['height'], profile['fps'],
+                         threads=trim_threads, cancel_token=cancel_token)
+
+    def prepare(index, segment):
+        try:
+            return prepare_clip(index, segment)
+        finally:
+            if progress:
+                progress.finish(index)
+
+    def prepare_clip(index, segment):
+        (t1, t2), video_url = segment
+        cache_keys = []
+        if not video_url:
+            return cache_keys, None
+        duration = t2 - t1
+        try:
+            raise_if_cancelled(cancel_token)
+            if PARTIAL_DOWNLOADS:
+                # Only the first `duration` seconds are used, plus headroom for container overhead
+                max_bytes = max(PARTIAL_DOWNLOAD_MIN_BYTES, int(duration * PARTIAL_DOWNLOAD_BYTES_PER_SECOND * 1.5))
+                cache_key, clip_path = media_cache.acquire(
+                    video_url, fetcher(index, max_bytes), variant=f"head{max_bytes}")
+                cache_keys.append(cache_key)
+                try:
+                    return cache_keys, pretrim(clip_path, index, duration)
+                except TaskCancelled:
+                    raise
+                except Exception:
+                    # The truncated head is not playable (e.g. moov atom at the end), fetch the whole file
+                    logger.warning(f"Partial download of {video_url} unreadable, downloading full clip")
+            cache_key, clip_path = media_cache.acquire(video_url, fetcher(index))
+            cache_keys.append(cache_key)
+            return cache_keys, pretrim(clip_path, index, duration)
+        except TaskCancelled:
+            # Still hand back the keys so they get released; the caller checks the token
+            return cache_keys, None
+        except Exception as e:
+            logger.error(f"Failed to prepare {video_url}: {str(e)}")
+            return cache_keys, None
+
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_CONCURRENCY) as pool:
+        return list(pool.map(prepare, range(len(background_video_data)), background_video_data))
 
 def search_program(program_name):
     try: 
@@ -157,15 +296,152 @@ def generate_video_url(timed_video_searches, video_server):
 
 # ====================== render_engine.py ======================
 # (Updated get_output_media function with font handling)
+def render_caption_image(text, font_settings, image_path, width):
+    """Rasterize one caption to an RGBA PNG the ffmpeg backend can overlay"""
+    rgba = caption_renderer.render(text, font_settings, width)
+    Image.fromarray(rgba, 'RGBA').save(image_path)
+    return image_path
+
+def caption_clip(text, font_settings, width):
+    """ImageClip with an alpha mask for one caption, for the MoviePy compositor"""
+    ImageClip = moviepy_editor().ImageClip
+    rgba = caption_renderer.render(text, font_settings, width)
+    mask = ImageClip(rgba[:, :, 3] / 255.0, ismask=True)
+    return ImageClip(rgba[:, :, :3]).set_mask(mask)
+
+def fill_frame(clip, width, height):
+    """Scale a clip to cover width x height and crop the centre, as trim_clip does with ffmpeg"""
+    if tuple(clip.size) == (width, height):
+        return clip
+    import numpy as np
+    scale = max(width / clip.w, height / clip.h)
+    scaled = (max(width, round(clip.w * scale)), max(height, round(clip.h * scale)))
+    left, top = (scaled[0] - width) // 2, (scaled[1] - height) // 2
+    box = (left, top, left + width, top + height)
+    clip = clip.fl_image(lambda frame: np.asarray(Image.fromarray(frame).resize(scaled, Image.LANCZOS).crop(box)))
+    clip.size = (width, height)
+    return clip
+
+def render_moviepy(output_file, audio_file_path, timed_captions, segments, font_settings, profile,
+                   duration=None, threads=4, cancel_token=None, on_progress=None):
+    """Composite frame by frame in Python and encode through MoviePy.
+
+    Without audio the video lasts `duration` seconds (default: up to the last clip).
+    on_progress(seconds encoded, duration) is called for every frame.
+    """
+    editor = moviepy_editor()
+    visual_clips = []
+    temp_audiofile = None
+    try:
+        for t1, t2, clip_path in segments:
+            try:
+                clip = editor.VideoFileClip(clip_path, audio=False)
+                clip = clip.subclip(0, min(t2 - t1, clip.duration)).set_start(t1)
+                # Pre-trimmed clips already match the profile; raw footage (PRETRIM_CLIPS=0) does not
+                clip = fill_frame(clip, profile['width'], profile['height'])
+                visual_clips.append(clip)
+            except Exception as e:
+                logger.error(f"Failed to process {clip_path}: {str(e)}")
+
+        # Process captions
+        for (start, end), text in timed_captions:
+            try:
+                txt_clip = caption_clip(text, font_settings, profile['width']).set_start(start).set_end(end).set_position(("center", caption_y(profile)))
+                visual_clips.append(txt_clip)
+            except Exception as e:
+                logger.error(f"Failed to create caption: {str(e)}")
+
+        # Create final video
+        final_video = editor.CompositeVideoClip(visual_clips, size=(profile['width'], profile['height']))
+    
+        # Add audio
+        if audio_file_path and os.path.exists(audio_file_path):
+            audio = editor.AudioFileClip(audio_file_path)
+            final_video = final_video.set_audio(audio)
+            final_video.duration = audio.duration
+        elif duration is not None:
+            final_video.duration = duration
+
+        # Render output; the temporary audio track goes next to the output
+        # instead of the working directory so a cancelled render can remove it
+        temp_audiofile = os.path.splitext(output_file)[0] + "_TEMP_audio.m4a"
+        final_video.write_videofile(
+            output_file,
+            codec='libx264',
+            audio_codec='aac',
+            temp_audiofile=temp_audiofile,
+            fps=profile['fps'],
+            preset=profile['preset'],
+            threads=threads,
+            logger=TaskBarLogger(
+                cancel_token,
+                (lambda frames, total: on_progress(frames / profile['fps'], final_video.duration)) if on_progress else None
+            )
+        )
+    finally:
+        # Release the ffmpeg readers
+        for clip in visual_clips:
+            clip.close()
+        if temp_audiofile and os.path.exists(temp_audiofile):
+            os.remove(temp_audiofile)
+
+def render_ffmpeg(output_file, audio_file_path, timed_captions, segments, font_settings, work_dir, profile,
+                  duration=None, threads=4, cancel_token=None, on_progress=None):
+    """Build the whole timeline as one ffmpeg filtergraph"""
+    captions = []
+    for i, ((start, end), text) in enumerate(timed_captions):
+        try:
+            image_path = render_caption_image(
+                text, font_settings, os.path.join(work_dir, f"caption_{i:04d}.png"), profile['width'])
+            captions.append((start, end, image_path, caption_y(profile)))
+        except Exception as e:
+            logger.error(f"Failed to create caption: {str(e)}")
+
+    has_audio = bool(audio_file_path) and os.path.exists(audio_file_path)
+    if has_audio:
+        duration = probe_clip(audio_file_path)[3]
+    elif duration is None:
+        duration = max([t2 for _, t2, _ in segments] + [end for _, end, _, _ in captions] + [0])
+
+    render_with_ffmpeg(
+        output_file,
+        duration,
+        segments,
+        captions,
+        audio_file_path=audio_file_path if has_audio else None,
+        width=profile['width'],
+        height=profile['height'],
+        fps=profile['fps'],
+        preset=profile['preset'],
+        threads=threads,
+        cancel_token=cancel_token,
+        on_progress=on_progress
+    )
+
 def get_output_media(
     audio_file_path,
     timed_captions,
     background_video_data,
     video_server,
-    font_settings=None  # Accept single font_settings parameter
+    font_settings=None,  # Accept single font_settings parameter
+    render_backend=None,
+    render_profile=None,
+    keep_audio=False,
+    render_chunks=None,
+    cancel_token=None,
+    on_progress=None
 ):
+    """Render the video and return its file name in the output directory.
+
+    on_progress(phase, done, total, **detail) reports the "download" phase
+    in clips (with bytes=downloaded) and the "encode" phase in seconds of video.
+    """
     output_dir = "/app/output"
     os.makedirs(output_dir, exist_ok=True)
+    render_backend = render_backend or RENDER_BACKEND
+    if render_backend not in RENDER_BACKENDS:
+        raise ValueError(f"Unknown render backend '{render_backend}'")
+    profile = get_render_profile(render_profile)
     
     # Set default font settings
     if not font_settings:
@@ -180,65 +456,68 @@ def get_output_media(
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     rand_suffix = f"{random.randint(1,99):02d}"  # Pad to 2 digits
     output_file = os.path.join(output_dir, f"video_{timestamp}_{rand_suffix}.mp4")
+    if profile['name'] != 'final':
+        output_file = output_file.replace('.mp4', f"_{profile['name']}.mp4")
+    font_settings = scale_font_settings(font_settings, profile)
 
-    # Configure ImageMagick
-    magick_path = get_program_path("magick") or '/usr/bin/convert'
-    os.environ['IMAGEMAGICK_BINARY'] = magick_path
-
-    # Create clips
-    visual_clips = []
+    # Encode faster while other tasks are waiting
+    profile = dict(profile, preset=cpu_budget.preset(profile['preset']))
+    media_cache = get_media_cache()
+    cache_keys = []
+    work_dir = tempfile.mkdtemp(prefix="render_")
     
-    # Process background videos
-    for (t1, t2), video_url in background_video_data:
-        if video_url:
-            try:
-                with tempfile.NamedTemporaryFile(delete=False) as tmp:
-                    download_file(video_url, tmp.name)
-                    clip = VideoFileClip(tmp.name).subclip(t1, t2)
-                    visual_clips.append(clip)
-            except Exception as e:
-                logger.error(f"Failed to process {video_url}: {str(e)}")
-
-    # Process captions
-    for (start, end), text in timed_captions:
-        try:
-            txt_clip = TextClip(
-                text,
-                fontsize=font_settings['size'],
-                color=font_settings['color'],
-                font=font_settings['family'],
-                stroke_color=font_settings['stroke_color'],
-                stroke_width=font_settings['stroke_width'],
-                size=(1920, None),
-                method='caption'
-            ).set_start(start).set_end(end).set_position(("center", 800))
-            visual_clips.append(txt_clip)
-        except Exception as e:
-            logger.error(f"Failed to create caption: {str(e)}")
+    try:
+        # Downloads, trims and the encode share this task's slice of the cores
+        with cpu_budget.allocate('render') as threads:
+            # Process background videos: each segment shows the first t2 - t1 seconds of its clip
+            prepared_clips = prepare_background_clips(
+                media_cache, background_video_data, work_dir, profile, threads, cancel_token,
+                on_progress=(lambda done, total, **detail: on_progress('download', done, total, **detail))
+                if on_progress else None)
+            encode_progress = (lambda done, total: on_progress('encode', done, total)) if on_progress else None
+            segments = []
+            for ((t1, t2), video_url), (keys, clip_path) in zip(background_video_data, prepared_clips):
+                cache_keys.extend(keys)
+                if clip_path:
+                    segments.append((t1, t2, clip_path))
+            raise_if_cancelled(cancel_token)
 
-    # Create final video
-    final_video = CompositeVideoClip(visual_clips)
-    
-    # Add audio
-    if os.path.exists(audio_file_path):
-        audio = AudioFileClip(audio_file_path)
-        final_video = final_video.set_audio(audio)
-        final_video.duration = audio.duration
-
-    # Render output
-    final_video.write_videofile(
-        output_file,
-        codec='libx264',
-        audio_codec='aac',
-        fps=24,
-        preset='fast',
-        threads=4,
-        logger='bar'
-    )
+            has_audio = os.path.exists(audio_file_path)
+            video_duration = probe_clip(audio_file_path)[3] if has_audio else max([t2 for _, t2, _ in segments] + [0])
+            encode_started = time.perf_counter()
+            render_chunks = render_chunks or RENDER_CHUNKS
+            chunked = False
+            if render_chunks > 1 and has_audio:
+                # Chunks are cut from the narration's length; the narration itself is muxed once at the end
+                chunked = render_chunked(
+                    render_backend, output_file, audio_file_path, video_duration,
+                    timed_captions, segments, font_settings, profile, work_dir, render_chunks, total_threads=threads,
+                    cancel_token=cancel_token, on_progress=encode_progress)
+            if not chunked and render_backend == 'ffmpeg':
+                render_ffmpeg(output_file, audio_file_path, timed_captions, segments, font_settings, work_dir, profile,
+                              threads=threads, cancel_token=cancel_token, on_progress=encode_progress)
+            elif not chunked:
+                render_moviepy(output_file, audio_file_path, timed_captions, segments, font_settings, profile,
+                               threads=threads, cancel_token=cancel_token, on_progress=encode_progress)
+            encode_seconds = time.perf_counter() - encode_started
+            ENCODE_SECONDS.observe(encode_seconds, backend=render_backend, profile=profile['name'])
+            if encode_seconds > 0:
+                ENCODE_FPS.observe(video_duration * profile['fps'] / encode_seconds,
+                                   backend=render_backend, profile=profile['name'])
+    except BaseException:
+        # No half-written videos in the output directory
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        raise
+    finally:
+        # Let the cache evict the clips again
+        for cache_key in cache_keys:
+            media_cache.release(cache_key)
+        shutil.rmtree(work_dir, ignore_errors=True)
 
-    # Cleanup
-    if os.path.exists(audio_file_path):
+    # Cleanup, unless the narration is kept to re-render this video later
+    if not keep_audio and os.path.exists(audio_file_path):
         os.remove(audio_file_path)
 
     # return output_file
-    return os.path.basename(output_file)
\ No newline at end of file
+    return os.path.basename(output_file)
@@ -1,13 +1,28 @@
+import sys
 import time
 import logging
 from functools import wraps
 from requests.exceptions import RequestException
-from openai import APIError, RateLimitError, APIConnectionError
+from utility.metrics import API_RETRIES
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class _Unraisable(Exception):
+    """Stand-in for the openai error classes while the SDK is not loaded"""
+
+def openai_errors():
+    """(RateLimitError, APIConnectionError, APIError) from the openai SDK if something imported it.
+
+    Only calls made through the SDK raise these, so the SDK is never imported
+    here just to name them; until it is loaded nothing can match.
+    """
+    openai = sys.modules.get('openai')
+    if openai is None:
+        return _Unraisable, _Unraisable, _Unraisable
+    return openai.RateLimitError, openai.APIConnectionError, openai.APIError
+
 def retry_api_call(max_retries=3, initial_delay=1, backoff_factor=2):
     """
     Decorator for retrying API calls with exponential backoff.
@@ -22,18 +37,21 @@ def retry_api_call(max_retries=3, initial_delay=1, backoff_factor=2):
         def wrapper(*args, **kwargs):
             retries = 0
             delay = initial_delay
+            RateLimitError, APIConnectionError, APIError = openai_errors()
             
             while retries < max_retries:
                 try:
                     return func(*args, **kwargs)
                 
                 except RateLimitError as e:
+                    API_RETRIES.inc(function=func.__name__, error='rate_limit')
                     logger.warning(f"Rate limit exceeded. Retrying in {delay} seconds... (Attempt {retries + 1}/{max_retries})")
                     time.sleep(delay)
                     retries += 1
                     delay *= backoff_factor
                     
                 except APIConnectionError as e:
+                    API_RETRIES.inc(function=func.__name__, error='connection')
                     logger.warning(f"API connection error. Retrying in {delay} seconds... (Attempt {retries + 1}/{max_retries})")
                     time.sleep(delay)
                     retries += 1
@@ -62,6 +80,7 @@ def handle_common_errors(func):
     """
     @wraps(func)
     def wrapper(*args, **kwargs):
+        RateLimitError, APIConnectionError, APIError = openai_errors()
         try:
             return func(*args, **kwargs)
             
@@ -3,31 +3,33 @@ import json
 import requests
 import logging
 from utility.retry_utils import retry_api_call, handle_common_errors
+from utility.llm_client import chat, MalformedOutput, ScriptStreamParser
+from utility.video.video_search_query_generator import count_structured_output
 
 logger = logging.getLogger(__name__)
 
 
-# Ollama configuration
-OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+# Ollama configuration; whether Ollama is reachable is reported by /ready, not checked at import
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gemma3:12b")
 
-def get_ai_client():
-    """Initialize and return Ollama client configuration"""
-    # Test Ollama connection
-    try:
-        response = requests.get(f"{OLLAMA_HOST}/api/tags")
-        response.raise_for_status()
-        return None, OLLAMA_MODEL  # We don't need a client object for Ollama
-    except Exception as e:
-        logger.error(f"Ollama connection failed: {str(e)}")
-        raise ValueError("Failed to connect to Ollama. Is it running?")
+# Ollama constrains generation to this schema
+SCRIPT_SCHEMA = {
+    "type": "object",
+    "properties": {"script": {"type": "string", "minLength": 1}},
+    "required": ["script"]
+}
 
-# Initialize model
-_, model = get_ai_client()
+def is_script_response(content):
+    """True for a JSON object with a non-empty 'script', the only answers worth caching"""
+    try:
+        script = json.loads(content).get("script")
+    except (json.JSONDecodeError, AttributeError):
+        return False
+    return isinstance(script, str) and bool(script.strip())
 
 @handle_common_errors
 @retry_api_call(max_retries=3, initial_delay=1, backoff_factor=2)
-def generate_script(topic, language="en"):
+def generate_script(topic, language="en", use_cache=True, on_partial_script=None, cancel_token=None):
     # English prompt
     en_prompt = """
         You are a seasoned content writer for a YouTube Shorts channel, specializing in facts videos. 
@@ -85,7 +87,7 @@ def generate_script(topic, language="en"):
     try:
         # Prepare the Ollama API request
         payload = {
-            "model": model,
+            "model": OLLAMA_MODEL,
             "messages": [
                 {
                     "role": "system", 
@@ -97,18 +99,30 @@ def generate_script(topic, language="en"):
                 }
             ],
             "stream": False,
-            "format": "json"  # Request JSON response
+            "format": SCRIPT_SCHEMA  # Request JSON matching the schema
         }
 
-        response = requests.post(
-            f"{OLLAMA_HOST}/api/chat",
-            json=payload,
-            headers={"Content-Type": "application/json"}
-        )
-        response.raise_for_status()
+        # Decode the script as it streams in and stop at once if the answer is not {"script": ...}
+        parser = ScriptStreamParser()
+        def on_partial(content):
+            script_so_far = parser.feed(content)
+            if on_partial_script and script_so_far:
+                on_partial_script(script_so_far)
 
-        content = response.json()
-        message_content = content["message"]["content"]
+        try:
+            message_content = chat(payload, timeout=600, use_cache=use_cache, cacheable=is_script_response,
+                                   on_partial=on_partial, cancel_token=cancel_token)
+        except MalformedOutput as e:
+            # Keep the script decoded before the output went wrong, up to its last full sentence
+            salvaged = parser.script[:max(parser.script.rfind(end) for end in '.!?') + 1] or parser.script
+            if salvaged.strip():
+                logger.warning(f"Stopped malformed script output early ({e}), keeping the script decoded so far")
+                message_content = json.dumps({"script": salvaged.strip()})
+            else:
+                logger.warning(f"Stopped malformed script output early ({e}) with no script, asking again")
+                count_structured_output('script_reasked')
+                message_content = chat(payload, timeout=600, use_cache=False, cacheable=is_script_response,
+                                       cancel_token=cancel_token)
         
         # Handle the response
         try:
@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+import logging
+from collections import deque
+from utility.tasks.scheduler import QueueFullError, MAX_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+# Topics accepted in one /generate/batch request
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "500"))
+# Tasks of batches admitted to the pipeline at once; the rest of the queue
+# stays free for single /generate requests
+BATCH_MAX_IN_FLIGHT = int(os.getenv("BATCH_MAX_IN_FLIGHT", str(max(1, MAX_QUEUE_DEPTH // 2))))
+# Finished batches are forgotten this many seconds after their last task ended
+BATCH_TTL_SECONDS = float(os.getenv("BATCH_TTL_SECONDS", str(24 * 3600)))
+
+
+class BatchFeeder:
+    """Holds the tasks of submitted batches and releases them into the pipeline.
+
+    A batch of hundreds of topics is accepted at once, but only
+    max_in_flight of its tasks are queued or running at any time, so it
+    neither trips the admission limit nor starves single requests. Tasks
+    are released in submission order; a task finishing frees a slot.
+    """
+
+    def __init__(self, submit, max_in_flight=BATCH_MAX_IN_FLIGHT, ttl=BATCH_TTL_SECONDS):
+        # submit(ctx, priority) queues a task and may raise QueueFullError
+        self.submit = submit
+        self.max_in_flight = max(1, max_in_flight)
+        self.ttl = ttl
+        self._pending = deque()  # (ctx, priority) not yet submitted
+        self._in_flight = set()
+        self._batches = {}  # batch_id -> {'task_ids', 'created_at', 'finished_at'}
+        self._unfinished = {}  # batch_id -> task ids not finished yet
+        self._task_batches = {}  # task_id -> batch_id until the task finishes
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def add(self, batch_id, tasks):
+        """Hold a batch's (ctx, priority) pairs until slots free up"""
+        with self._cond:
+            self._evict_expired()
+            task_ids = [ctx['task_id'] for ctx, _ in tasks]
+            self._batches[batch_id] = {'task_ids': task_ids, 'created_at': time.time(), 'finished_at': None}
+            self._unfinished[batch_id] = set(task_ids)
+            self._task_batches.update((task_id, batch_id) for task_id in task_ids)
+            self._pending.extend(tasks)
+            if self._thread is None:
+                # Started with the first batch, not at import time
+                self._thread = threading.Thread(target=self._feed_loop, name="batch-feeder", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def get(self, batch_id):
+        """Task ids and timestamps of a batch, or None if it is unknown"""
+        with self._cond:
+            batch = self._batches.get(batch_id)
+            return dict(batch, task_ids=list(batch['task_ids'])) if batch is not None else None
+
+    def pending_count(self, batch_id=None):
+        with self._cond:
+            return sum(1 for ctx, _ in self._pending
+                       if batch_id is None or self._task_batches.get(ctx['task_id']) == batch_id)
+
+    def cancel(self, task_id):
+        """Drop a task that has not been released yet. Returns its context, or None."""
+        with self._cond:
+            for entry in self._pending:
+                if entry[0]['task_id'] == task_id:
+                    self._pending.remove(entry)
+                    return entry[0]
+        return None
+
+    def task_finished(self, task_id):
+        """Free the slot of a finished task; safe to call for tasks of no batch"""
+        with self._cond:
+            self._in_flight.discard(task_id)
+            batch_id = self._task_batches.pop(task_id, None)
+            unfinished = self._unfinished.get(batch_id)
+            if unfinished is not None:
+                unfinished.discard(task_id)
+                if not unfinished:
+                    del self._unfinished[batch_id]
+                    self._batches[batch_id]['finished_at'] = time.time()
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'batches': len(self._batches),
+                'unfinished_batches': len(self._unfinished),
+                'pending': len(self._pending),
+                'in_flight': len(self._in_flight),
+                'max_in_flight': self.max_in_flight
+            }
+
+    def _evict_expired(self):
+        cutoff = time.time() - self.ttl
+        for batch_id in [batch_id for batch_id, batch in self._batches.items()
+                         if batch['finished_at'] is not None and batch['finished_at'] < cutoff]:
+            del self._batches[batch_id]
+
+    def _feed_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending or len(self._in_flight) >= self.max_in_flight:
+                    self._cond.wait()
+                ctx, priority = self._pending.popleft()
+                self._in_flight.add(ctx['task_id'])
+
+            try:
+                self.submit(ctx, priority)
+            except QueueFullError as e:
+                # Single requests filled the queue; try again once it drains
+                with self._cond:
+                    self._in_flight.discard(ctx['task_id'])
+                    self._pending.appendleft((ctx, priority))
+                    self._cond.wait(e.retry_after)
+            except Exception as e:
+                logger.error(f"Failed to release batch task {ctx['task_id']}: {str(e)}", exc_info=True)
+                with self._cond:
+                    self._in_flight.discard(ctx['task_id'])
@@ -0,0 +1,137 @@
+import os
+import signal
+import threading
+import subprocess
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seconds between cancellation checks while waiting on a child process
+POLL_INTERVAL = 0.1
+# Grace period between SIGTERM and SIGKILL for a cancelled child
+KILL_GRACE_SECONDS = 0.5
+
+
+class TaskCancelled(Exception):
+    """Raised inside a stage when the user cancelled the task"""
+
+
+class CancellationToken:
+    """Flag shared by everything working on one task.
+
+    Long-running steps check it between units of work (download chunks,
+    encoded frames, decoder steps, streamed LLM chunks) and child processes
+    are killed when it is set. event may be a multiprocessing.Event so
+    worker processes can watch the same flag.
+    """
+
+    def __init__(self, event=None):
+        self._event = event if event is not None else threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        self._event.set()
+        with self._lock:
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.warning("Cancellation callback failed", exc_info=True)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise TaskCancelled("Task cancelled by user")
+
+    def on_cancel(self, callback):
+        """Call callback() as soon as the token is cancelled (at once if it already is)"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+def raise_if_cancelled(token):
+    """token.raise_if_cancelled() for an optional token"""
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def run_process(command, cancel_token=None, on_output_line=None, process_group=False):
+    """subprocess.run(command, check=True) that kills the child within POLL_INTERVAL of cancellation.
+
+    Raises TaskCancelled when cancelled and CalledProcessError when the
+    command fails; stderr is captured for the error message. With
+    on_output_line, each line the child writes to stdout is passed to it
+    (from a reader thread) as it arrives. process_group=True starts the
+    child in its own process group and signals the whole group, so
+    processes the child started itself are stopped with it.
+    """
+    if cancel_token is None and on_output_line is None:
+        return subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    raise_if_cancelled(cancel_token)
+    process = subprocess.Popen(command, stdout=subprocess.PIPE if on_output_line else subprocess.DEVNULL,
+                               stderr=subprocess.PIPE, start_new_session=process_group)
+    # Drain stderr on a thread so a chatty child never blocks on a full pipe
+    stderr_chunks = []
+    readers = [threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)]
+    if on_output_line:
+        readers.append(threading.Thread(target=_read_lines, args=(process.stdout, on_output_line), daemon=True))
+    for reader in readers:
+        reader.start()
+    try:
+        while True:
+            try:
+                process.wait(timeout=POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                if cancel_token is not None and cancel_token.cancelled:
+                    _send_signal(process, signal.SIGTERM, process_group)
+                    try:
+                        process.wait(timeout=KILL_GRACE_SECONDS)
+                    except subprocess.TimeoutExpired:
+                        pass
+                    # The group's other members may outlive its leader
+                    _send_signal(process, signal.SIGKILL, process_group)
+                    process.wait()
+                    raise TaskCancelled("Task cancelled by user")
+    finally:
+        for reader in readers:
+            reader.join(timeout=KILL_GRACE_SECONDS)
+        process.stderr.close()
+        if process.stdout:
+            process.stdout.close()
+    stderr = b"".join(chunk for chunk in stderr_chunks if chunk)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr)
+    return subprocess.CompletedProcess(command, process.returncode, stderr=stderr)
+
+
+def _send_signal(process, signum, process_group):
+    try:
+        if process_group:
+            os.killpg(process.pid, signum)
+        elif process.poll() is None:
+            process.send_signal(signum)
+    except ProcessLookupError:
+        pass
+
+
+def _read_lines(stream, on_line):
+    for raw in iter(stream.readline, b''):
+        try:
+            on_line(raw.decode(errors='replace').rstrip())
+        except Exception:
+            logger.warning("Process output callback failed", exc_info=True)
@@ -0,0 +1,86 @@
+import os
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Cores shared by CPU-bound work (Whisper, trimming, encoding); defaults to all of them
+CPU_CORES = int(os.getenv("CPU_CORES", "0")) or os.cpu_count() or 1
+# Upper bound for one job's allowance; x264 gains little past ~16 threads
+MAX_JOB_THREADS = int(os.getenv("MAX_JOB_THREADS", "16"))
+# Queue depths at which encodes step one, then two presets faster; empty disables adaptation
+ADAPTIVE_PRESET_DEPTHS = [int(d) for d in os.getenv("ADAPTIVE_PRESET_DEPTHS", "4,12").split(",") if d.strip()]
+
+# x264 presets from fastest to slowest
+X264_PRESETS = ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower', 'veryslow')
+
+
+class CpuBudget:
+    """Splits the machine's cores between the CPU-bound jobs running at the same time.
+
+    Each job asks for an allowance when it starts and gets the cores nobody
+    else holds, but at least an equal share among the jobs active at that
+    moment. Allowances cannot shrink once an encoder runs, so a burst of
+    jobs can overshoot the core count until the earlier ones finish.
+    """
+
+    def __init__(self, cores=CPU_CORES, max_job_threads=MAX_JOB_THREADS, preset_depths=None):
+        self.cores = max(1, cores)
+        self.max_job_threads = max(1, max_job_threads)
+        self.preset_depths = sorted(ADAPTIVE_PRESET_DEPTHS if preset_depths is None else preset_depths)
+        self._active = {}  # token -> (kind, threads)
+        self._lock = threading.Lock()
+        self._queue_depth = lambda: 0
+
+    def bind_queue_depth(self, func):
+        """Use func() as the number of jobs waiting, for preset selection"""
+        self._queue_depth = func
+
+    @contextmanager
+    def allocate(self, kind):
+        """Context manager yielding the thread count this job may use"""
+        token = object()
+        with self._lock:
+            held = sum(threads for _, threads in self._active.values())
+            fair_share = self.cores // (len(self._active) + 1)
+            threads = max(1, min(self.max_job_threads, max(self.cores - held, fair_share)))
+            self._active[token] = (kind, threads)
+        try:
+            yield threads
+        finally:
+            with self._lock:
+                del self._active[token]
+
+    def preset(self, base_preset):
+        """base_preset, stepped towards faster presets while the queue is backed up"""
+        if base_preset not in X264_PRESETS:
+            return base_preset
+        try:
+            depth = self._queue_depth()
+        except Exception:
+            logger.warning("Queue depth unavailable for preset selection", exc_info=True)
+            depth = 0
+        steps = sum(1 for threshold in self.preset_depths if depth >= threshold)
+        return X264_PRESETS[max(0, X264_PRESETS.index(base_preset) - steps)]
+
+    def stats(self):
+        with self._lock:
+            active = {}
+            threads = 0
+            for kind, job_threads in self._active.values():
+                active[kind] = active.get(kind, 0) + 1
+                threads += job_threads
+        return {'cores': self.cores, 'threads_allocated': threads, 'active': active}
+
+
+cpu_budget = CpuBudget()
+
+
+def set_torch_threads(threads):
+    """Limit torch's intra-op threads; process-wide, so callers serialize transcriptions"""
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
@@ -0,0 +1,110 @@
+import logging
+import threading
+from utility.tasks.scheduler import JobScheduler, QueueFullError, MAX_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+
+class StagePipeline:
+    """Chain of stages, each with its own worker pool, that a task context moves through.
+
+    While one task renders, others can be waiting on the LLM or searching
+    Pexels on their own stage's workers. Admission counts tasks admitted and
+    not yet finished in any stage, so tasks that pass the quick stages and
+    pile up in front of the render still count; once admitted a task always
+    gets to finish.
+    """
+
+    def __init__(self, stages, on_error, max_queue_depth=MAX_QUEUE_DEPTH):
+        # stages: list of (name, func(ctx), worker count)
+        self.stages = []
+        for name, func, workers in stages:
+            self.stages.append((name, func, JobScheduler(max_workers=workers, max_queue_depth=None)))
+        self.on_error = on_error
+        self.max_queue_depth = max_queue_depth
+        self._admitted = set()
+        self._lock = threading.Lock()
+
+    def submit(self, job_id, ctx, priority=0, start_stage=None):
+        """Queue ctx on the first stage, or on start_stage to skip work already done.
+
+        Raises QueueFullError when admission is refused.
+        """
+        index = 0
+        if start_stage is not None:
+            names = [name for name, _, _ in self.stages]
+            index = names.index(start_stage) if start_stage in names else 0
+        with self._lock:
+            if self.max_queue_depth is not None and len(self._admitted) >= self.max_queue_depth:
+                raise QueueFullError(self.estimate_retry())
+            self._admitted.add(job_id)
+        try:
+            self._submit(index, job_id, ctx, priority)
+        except Exception:
+            self._finished(job_id)
+            raise
+
+    def _finished(self, job_id):
+        with self._lock:
+            self._admitted.discard(job_id)
+
+    def estimate_retry(self):
+        """Rough seconds until admission frees up, from the stage with the longest backlog"""
+        return max(scheduler.estimate_wait(scheduler.queue_depth() + 1) for _, _, scheduler in self.stages)
+
+    def _submit(self, index, job_id, ctx, priority):
+        scheduler = self.stages[index][2]
+        scheduler.submit(job_id, self._run, index, job_id, ctx, priority, priority=priority)
+
+    def _run(self, index, job_id, ctx, priority):
+        name, func, _ = self.stages[index]
+        try:
+            func(ctx)
+        except Exception as e:
+            self._finished(job_id)
+            try:
+                self.on_error(ctx, e)
+            except Exception:
+                logger.error(f"Error handler failed for job {job_id} in stage '{name}'", exc_info=True)
+            return
+        if index + 1 < len(self.stages):
+            self._submit(index + 1, job_id, ctx, priority)
+        else:
+            self._finished(job_id)
+
+    def cancel(self, job_id):
+        """Remove a job waiting between stages. Returns its context, or None if it is running or unknown."""
+        for _, _, scheduler in self.stages:
+            job = scheduler.cancel(job_id)
+            if job is not None:
+                self._finished(job_id)
+                _, args, _ = job
+                return args[2]
+        return None
+
+    def position(self, job_id):
+        """(stage, 1-based position, stage queue depth, estimated wait) for a waiting job, else None"""
+        for name, _, scheduler in self.stages:
+            position = scheduler.position(job_id)
+            if position is not None:
+                return name, position, scheduler.queue_depth(), scheduler.estimate_wait(position)
+        return None
+
+    def queue_depth(self):
+        return sum(scheduler.queue_depth() for _, _, scheduler in self.stages)
+
+    def active_count(self):
+        return sum(scheduler.active_count() for _, _, scheduler in self.stages)
+
+    def admitted_count(self):
+        """Tasks admitted and not finished yet, the number held against max_queue_depth"""
+        with self._lock:
+            return len(self._admitted)
+
+    def stats(self):
+        return [{
+            'stage': name,
+            'workers': scheduler.max_workers,
+            'queued': scheduler.queue_depth(),
+            'active': scheduler.active_count()
+        } for name, _, scheduler in self.stages]
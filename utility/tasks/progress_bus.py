@@ -0,0 +1,90 @@
+import os
+import time
+import threading
+from collections import deque
+from utility.tasks.task_store import FINISHED_STATUSES
+
+# Events kept for clients that reconnect with Last-Event-ID or poll with ?since=
+PROGRESS_HISTORY = int(os.getenv("PROGRESS_HISTORY", "2000"))
+
+
+class ProgressBus:
+    """In-process fan-out of task progress to SSE and long-poll clients.
+
+    Every published change gets an increasing event id and carries the
+    task's merged state, so a client only needs the latest event of a task.
+    The current state of unfinished tasks is kept for clients joining late;
+    finished tasks are forgotten once their final event is published.
+    """
+
+    def __init__(self, history=PROGRESS_HISTORY):
+        self._events = deque(maxlen=history)
+        self._state = {}  # task_id -> merged fields of an unfinished task
+        self._last_id = 0
+        self._cond = threading.Condition()
+
+    @property
+    def last_id(self):
+        with self._cond:
+            return self._last_id
+
+    def publish(self, task_id, **fields):
+        """Merge fields into the task's state and wake everyone waiting for it"""
+        with self._cond:
+            self._last_id += 1
+            state = self._state.setdefault(task_id, {'task_id': task_id})
+            state.update(fields)
+            event = dict(state, id=self._last_id, time=time.time())
+            if state.get('status') in FINISHED_STATUSES:
+                del self._state[task_id]
+            self._events.append(event)
+            self._cond.notify_all()
+        return event
+
+    def forget(self, task_id):
+        with self._cond:
+            self._state.pop(task_id, None)
+
+    def snapshot(self, task_id=None):
+        """Current state of one unfinished task (or None), or of all of them"""
+        with self._cond:
+            if task_id is not None:
+                state = self._state.get(task_id)
+                return dict(state) if state is not None else None
+            return [dict(state) for state in self._state.values()]
+
+    def covers(self, since):
+        """Whether every event after since is still in the history.
+
+        An id beyond the last one was issued before a restart reset the
+        counter, so the client has to start over from the current state.
+        """
+        with self._cond:
+            if since > self._last_id:
+                return False
+            return since == self._last_id or (bool(self._events) and self._events[0]['id'] <= since + 1)
+
+    def events_since(self, since, task_id=None):
+        with self._cond:
+            return self._events_since(since, task_id)
+
+    def wait(self, since, task_id=None, timeout=30):
+        """Events newer than since (for task_id only if given), blocking up to timeout for the first one"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._last_id > since and self._events_since(since, task_id), timeout)
+            return self._events_since(since, task_id)
+
+    def _events_since(self, since, task_id):
+        events = []
+        # Newest first until the client's position, then back in order
+        for event in reversed(self._events):
+            if event['id'] <= since:
+                break
+            if task_id is None or event['task_id'] == task_id:
+                events.append(event)
+        events.reverse()
+        return events
+
+    def stats(self):
+        with self._cond:
+            return {'last_id': self._last_id, 'tracked_tasks': len(self._state), 'history': len(self._events)}
@@ -0,0 +1,113 @@
+import os
+import heapq
+import itertools
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Number of video jobs that may run at the same time
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "2"))
+# Jobs waiting beyond this are rejected instead of queued
+MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", "20"))
+# Used for Retry-After until real job durations have been observed
+DEFAULT_JOB_SECONDS = float(os.getenv("DEFAULT_JOB_SECONDS", "120"))
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at its maximum depth"""
+
+    def __init__(self, retry_after):
+        super().__init__("Job queue is full")
+        self.retry_after = retry_after
+
+
+class JobScheduler:
+    """Fixed-size worker pool fed by a priority queue (FIFO within the same priority)"""
+
+    def __init__(self, max_workers=MAX_WORKERS, max_queue_depth=MAX_QUEUE_DEPTH):
+        self.max_workers = max(1, max_workers)
+        self.max_queue_depth = max_queue_depth
+        self._queue = []  # heap of (-priority, seq, job_id)
+        self._jobs = {}  # job_id -> (func, args, kwargs) while queued
+        self._running = set()
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._workers = []
+        self._avg_job_seconds = DEFAULT_JOB_SECONDS
+
+    def _ensure_workers(self):
+        # Workers start with the first submitted job, not at import time
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{len(self._workers)}", daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def submit(self, job_id, func, *args, priority=0, **kwargs):
+        """Queue func(*args, **kwargs) under job_id. Higher priority runs first."""
+        with self._cond:
+            if self.max_queue_depth is not None and len(self._queue) >= self.max_queue_depth:
+                raise QueueFullError(self.estimate_wait(len(self._queue) + 1))
+            self._jobs[job_id] = (func, args, kwargs)
+            heapq.heappush(self._queue, (-priority, next(self._seq), job_id))
+            self._ensure_workers()
+            self._cond.notify()
+
+    def cancel(self, job_id):
+        """Drop a job that has not started yet. Returns its (func, args, kwargs), or None if it is not queued."""
+        with self._cond:
+            if job_id not in self._jobs:
+                return None
+            job = self._jobs.pop(job_id)
+            self._queue = [entry for entry in self._queue if entry[2] != job_id]
+            heapq.heapify(self._queue)
+            return job
+
+    def position(self, job_id):
+        """1-based position of a queued job, or None if it is not waiting"""
+        with self._cond:
+            if job_id not in self._jobs:
+                return None
+            for i, entry in enumerate(sorted(self._queue), start=1):
+                if entry[2] == job_id:
+                    return i
+            return None
+
+    def estimate_wait(self, position):
+        """Rough seconds until a job at the given queue position starts"""
+        rounds = (position + self.max_workers - 1) // self.max_workers
+        return max(1, int(rounds * self._avg_job_seconds))
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._queue)
+
+    def active_count(self):
+        with self._cond:
+            return len(self._running)
+
+    def is_running(self, job_id):
+        with self._cond:
+            return job_id in self._running
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                _, _, job_id = heapq.heappop(self._queue)
+                func, args, kwargs = self._jobs.pop(job_id)
+                self._running.add(job_id)
+
+            start = time.time()
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Job {job_id} raised: {str(e)}", exc_info=True)
+            finally:
+                elapsed = time.time() - start
+                with self._cond:
+                    self._running.discard(job_id)
+                    # Exponential moving average keeps Retry-After in line with recent jobs
+                    self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * elapsed
@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# "sqlite" keeps tasks across restarts, "memory" keeps them in this process only
+TASK_STORE = os.getenv("TASK_STORE", "sqlite")
+TASK_DB_PATH = os.getenv("TASK_DB_PATH", "tasks.db")
+# Finished tasks are evicted this many seconds after their last update
+TASK_TTL_SECONDS = float(os.getenv("TASK_TTL_SECONDS", str(24 * 3600)))
+# Minimum time between two eviction sweeps
+TASK_EVICTION_INTERVAL = float(os.getenv("TASK_EVICTION_INTERVAL", "300"))
+
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+ACTIVE_STATUSES = ('queued', 'processing', 'cancelling')
+
+# Fields stored in their own columns; everything else lives in the JSON data column
+COLUMNS = ('status', 'topic', 'progress', 'message', 'created_at', 'updated_at')
+
+
+class MemoryTaskStore:
+    """Task store backed by a dict, for single-process use without persistence"""
+
+    def __init__(self, ttl=TASK_TTL_SECONDS):
+        self.ttl = ttl
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._last_eviction = time.time()
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Call callback(task_id, fields) after every successful create, update or transition"""
+        self._listeners.append(callback)
+
+    def _notify(self, task_id, fields):
+        for callback in self._listeners:
+            try:
+                callback(task_id, fields)
+            except Exception:
+                logger.warning("Task store listener failed", exc_info=True)
+
+    def create(self, task_id, task):
+        with self._lock:
+            self._tasks[task_id] = dict(task)
+        self._notify(task_id, task)
+        self._maybe_evict()
+
+    def get(self, task_id):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return dict(task) if task is not None else None
+
+    def update(self, task_id, **fields):
+        """Merge fields into a task. Returns False if the task does not exist."""
+        return self.transition(task_id, None, **fields)
+
+    def transition(self, task_id, from_statuses, **fields):
+        """Update a task only while its status is one of from_statuses (any status if None)"""
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None or (from_statuses is not None and task['status'] not in from_statuses):
+                return False
+            task.update(fields)
+        self._notify(task_id, fields)
+        return True
+
+    def delete(self, task_id):
+        with self._lock:
+            self._tasks.pop(task_id, None)
+
+    def list(self, status=None, created_after=None, created_before=None, limit=50, offset=0):
+        """Tasks matching the filters, newest first, and the total number of matches"""
+        with self._lock:
+            matches = [dict(task, task_id=task_id) for task_id, task in self._tasks.items()
+                       if (status is None or task['status'] == status)
+                       and (created_after is None or (task.get('created_at') or 0) >= created_after)
+                       and (created_before is None or (task.get('created_at') or 0) < created_before)]
+        matches.sort(key=lambda task: task.get('created_at') or 0, reverse=True)
+        return matches[offset:offset + limit], len(matches)
+
+    def evict_expired(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [task_id for task_id, task in self._tasks.items()
+                       if task['status'] in FINISHED_STATUSES and (task.get('updated_at') or 0) < cutoff]
+            for task_id in expired:
+                del self._tasks[task_id]
+        return len(expired)
+
+    def fail_interrupted(self):
+        return 0
+
+    def _maybe_evict(self):
+        if time.time() - self._last_eviction >= TASK_EVICTION_INTERVAL:
+            self._last_eviction = time.time()
+            evicted = self.evict_expired()
+            if evicted:
+                logger.info(f"Evicted {evicted} expired tasks")
+
+
+class SQLiteTaskStore(MemoryTaskStore):
+    """Task store persisted in SQLite with status and created_at indexes.
+
+    Each thread gets its own connection and the database runs in WAL mode,
+    so status reads never wait on workers writing progress.
+    """
+
+    def __init__(self, path=TASK_DB_PATH, ttl=TASK_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._last_eviction = time.time()
+        self._listeners = []
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    task_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    topic TEXT,
+                    progress REAL,
+                    message TEXT,
+                    created_at REAL,
+                    updated_at REAL,
+                    data TEXT NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, updated_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks (created_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = Transaction(conn)
+            conn = self._local.conn
+        return conn
+
+    @staticmethod
+    def _split(task):
+        columns = {name: task.get(name) for name in COLUMNS}
+        data = {key: value for key, value in task.items() if key not in COLUMNS and key != 'task_id'}
+        return columns, json.dumps(data)
+
+    @staticmethod
+    def _row_to_task(row):
+        task = json.loads(row['data'])
+        for name in COLUMNS:
+            if row[name] is not None:
+                task[name] = row[name]
+        return task
+
+    def create(self, task_id, task):
+        columns, data = self._split(task)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tasks (task_id, status, topic, progress, message, created_at, updated_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (task_id, *(columns[name] for name in COLUMNS), data))
+        self._notify(task_id, task)
+        self._maybe_evict()
+
+    def get(self, task_id):
+        row = self._connect().execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return self._row_to_task(row) if row is not None else None
+
+    def transition(self, task_id, from_statuses, **fields):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None or (from_statuses is not None and row['status'] not in from_statuses):
+                return False
+            task = self._row_to_task(row)
+            task.update(fields)
+            columns, data = self._split(task)
+            conn.execute(
+                "UPDATE tasks SET status = ?, topic = ?, progress = ?, message = ?, created_at = ?, updated_at = ?, "
+                "data = ? WHERE task_id = ?",
+                (*(columns[name] for name in COLUMNS), data, task_id))
+        self._notify(task_id, fields)
+        return True
+
+    def delete(self, task_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+
+    def list(self, status=None, created_after=None, created_before=None, limit=50, offset=0):
+        clauses, params = [], []
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if created_after is not None:
+            clauses.append("created_at >= ?")
+            params.append(created_after)
+        if created_before is not None:
+            clauses.append("created_at < ?")
+            params.append(created_before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        conn = self._connect()
+        total = conn.execute(f"SELECT COUNT(*) FROM tasks {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT * FROM tasks {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            (*params, limit, offset)).fetchall()
+        return [dict(self._row_to_task(row), task_id=row['task_id']) for row in rows], total
+
+    def evict_expired(self):
+        cutoff = time.time() - self.ttl
+        placeholders = ', '.join('?' for _ in FINISHED_STATUSES)
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"DELETE FROM tasks WHERE status IN ({placeholders}) AND updated_at < ?",
+                (*FINISHED_STATUSES, cutoff))
+            return cursor.rowcount
+
+    def fail_interrupted(self):
+        """Mark tasks that were in flight when the previous process stopped as failed"""
+        placeholders = ', '.join('?' for _ in ACTIVE_STATUSES)
+        rows = self._connect().execute(
+            f"SELECT task_id FROM tasks WHERE status IN ({placeholders})", ACTIVE_STATUSES).fetchall()
+        for row in rows:
+            self.update(row['task_id'], status='failed', error='Server restarted while the task was running',
+                        error_type='Interrupted', retryable=True, updated_at=time.time())
+        return len(rows)
+
+
+class Transaction:
+    """sqlite3 connection whose context manager wraps the block in BEGIN IMMEDIATE ... COMMIT"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, *args):
+        return self.conn.execute(*args)
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        return False
+
+
+def create_task_store(kind=TASK_STORE):
+    if kind == "memory":
+        return MemoryTaskStore()
+    if kind == "sqlite":
+        return SQLiteTaskStore()
+    raise ValueError(f"Unknown TASK_STORE '{kind}', expected 'sqlite' or 'memory'")
@@ -1,119 +1,275 @@
 import os 
+import re
+import threading
 import requests
 from utility.utils import log_response, LOG_TYPE_PEXEL
 from utility.retry_utils import retry_api_call, handle_common_errors
+from utility.cache_utils import TTLCache
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from utility.tasks.cancellation import raise_if_cancelled
+from utility.metrics import timed_call
 
 logger = logging.getLogger(__name__)
 
 # Use environment variable for API key
 PEXELS_API_KEY = os.environ.get('PEXELS_KEY', "aXA4IlmjYKdzM9R7JZX6l4SwVmxTsaJbMvp9l7jf7rE9VVbh5lbxvoKn")
 
-@handle_common_errors
-@retry_api_call(max_retries=3, initial_delay=1, backoff_factor=2)
+# Search results are reused for this long; Pexels results for a keyword rarely change
+PEXELS_CACHE_TTL = float(os.getenv("PEXELS_CACHE_TTL", str(24 * 3600)))
+PEXELS_PER_PAGE = 15
+PEXELS_API_URL = os.getenv("PEXELS_API_URL", "https://api.pexels.com/videos/search")
+# Searches in flight at once when looking up footage for all segments of a video
+PEXELS_SEARCH_CONCURRENCY = int(os.getenv("PEXELS_SEARCH_CONCURRENCY", "8"))
+# Write every search response to .logs/pexel_logs for debugging; one file
+# per request, so off unless asked for
+PEXELS_LOG_RESPONSES = os.getenv("PEXELS_LOG_RESPONSES", "0") == "1"
+
+_search_cache = None
+_search_cache_lock = threading.Lock()
+_prefetch_pool = None
+
+def get_search_cache():
+    """Process-wide Pexels search cache, created on first use"""
+    global _search_cache
+    with _search_cache_lock:
+        if _search_cache is None:
+            _search_cache = TTLCache("pexels_search", ttl=PEXELS_CACHE_TTL)
+        return _search_cache
+
+def normalize_query(query_string):
+    return re.sub(r'\s+', ' ', query_string.strip().lower())
+
 def search_videos(query_string, orientation_landscape=True):
-    """Search for videos on Pexels with enhanced error handling"""
+    """Search for videos on Pexels, answering repeated queries from the search cache"""
     if not query_string or len(query_string.strip()) < 2:
         logger.warning(f"Invalid query string: {query_string}")
         return None
 
-    url = "https://api.pexels.com/videos/search"
+    query = normalize_query(query_string)
+    orientation = "landscape" if orientation_landscape else "portrait"
+    cache_key = f"{query}|{orientation}|{PEXELS_PER_PAGE}"
+    cache = get_search_cache()
+    cached = cache.get(cache_key, count_miss=False)
+    if cached is not None:
+        return cached
+
+    # Tasks searching the same keyword at once share one request
+    with cache.fetch_lock(cache_key):
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+        json_data = fetch_search_results(query, orientation)
+        # Failed searches are not cached so they are retried next time
+        if json_data is not None:
+            cache.set(cache_key, json_data)
+        return json_data
+
+@handle_common_errors
+@retry_api_call(max_retries=3, initial_delay=1, backoff_factor=2)
+def fetch_search_results(query_string, orientation):
+    """Search for videos on Pexels with enhanced error handling"""
+    url = PEXELS_API_URL
     headers = {
         "Authorization": PEXELS_API_KEY,
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
     }
     params = {
         "query": query_string,
-        "orientation": "landscape" if orientation_landscape else "portrait",
-        "per_page": 15
+        "orientation": orientation,
+        "per_page": PEXELS_PER_PAGE
     }
 
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=15)
-        response.raise_for_status()
-        json_data = response.json()
-        log_response(LOG_TYPE_PEXEL, query_string, json_data)
+        with timed_call('pexels'):
+            response = requests.get(url, headers=headers, params=params, timeout=15)
+            response.raise_for_status()
+            json_data = response.json()
+        if PEXELS_LOG_RESPONSES:
+            log_response(LOG_TYPE_PEXEL, query_string, json_data)
         return json_data
     except requests.exceptions.HTTPError as e:
         if response.status_code == 401:
             logger.error("Invalid Pexels API key - update PEXELS_KEY environment variable")
         return None
 
-def getBestVideo(query_string, orientation_landscape=True, used_vids=None):
-    """Get the best matching video with improved query handling"""
-    used_vids = used_vids or []
-    
-    try:
-        vids = search_videos(query_string, orientation_landscape)
-        if not vids or 'videos' not in vids or not vids['videos']:
-            return None
-            
-        videos = vids['videos']
-        min_width = 1920 if orientation_landscape else 1080
-        min_height = 1080 if orientation_landscape else 1920
-
-        filtered_videos = [
-            video for video in videos 
-            if video.get('width', 0) >= min_width 
-            and video.get('height', 0) >= min_height
-            and video.get('id') not in used_vids
-        ]
-
-        if not filtered_videos:
-            return None
+def pick_rendition(video_files, min_width, min_height, footage_width=None):
+    """Link of the file to download for a video.
+
+    Full HD by default; with a smaller footage_width, the smallest rendition of
+    the same orientation that is at least that wide, falling back to full HD.
+    """
+    full_hd = next((f for f in video_files
+                    if f.get('width') == min_width and f.get('height') == min_height), None)
+    if footage_width and footage_width < min_width:
+        landscape = min_width >= min_height
+        smaller = [f for f in video_files
+                   if f.get('link') and f.get('width') and f.get('height')
+                   and (f['width'] >= f['height']) == landscape
+                   and footage_width <= f['width'] < min_width]
+        if smaller:
+            return min(smaller, key=lambda f: f['width']).get('link')
+    return full_hd.get('link') if full_hd else None
 
-        # Prioritize videos closest to 15 seconds
-        sorted_videos = sorted(filtered_videos, 
-                             key=lambda x: abs(15 - x.get('duration', 0)))
+def select_best_video(vids, orientation_landscape=True, used_vids=None, footage_width=None):
+    """Pick the best unused video from a Pexels search response.
 
-        # Find first usable video URL
-        for video in sorted_videos:
-            video_files = sorted(video.get('video_files', []),
-                             key=lambda x: x.get('width', 0), reverse=True)
-            
-            for video_file in video_files:
-                if (video_file.get('width') == min_width and 
-                    video_file.get('height') == min_height):
-                    return video_file.get('link'), video.get('id')
+    Only videos with a full HD file are eligible, whatever footage_width asks
+    for, so the same videos are picked for a draft and for its final render.
+    """
+    used_vids = used_vids or set()
 
+    if not vids or 'videos' not in vids or not vids['videos']:
         return None
+        
+    videos = vids['videos']
+    min_width = 1920 if orientation_landscape else 1080
+    min_height = 1080 if orientation_landscape else 1920
+
+    filtered_videos = [
+        video for video in videos 
+        if video.get('width', 0) >= min_width 
+        and video.get('height', 0) >= min_height
+        and video.get('id') not in used_vids
+    ]
+
+    if not filtered_videos:
+        return None
+
+    # Prioritize videos closest to 15 seconds
+    sorted_videos = sorted(filtered_videos, 
+                         key=lambda x: abs(15 - x.get('duration', 0)))
+
+    # Find first usable video URL
+    for video in sorted_videos:
+        video_files = sorted(video.get('video_files', []),
+                         key=lambda x: x.get('width', 0), reverse=True)
+        
+        for video_file in video_files:
+            if (video_file.get('width') == min_width and 
+                video_file.get('height') == min_height):
+                return pick_rendition(video_files, min_width, min_height, footage_width), video.get('id')
+
+    return None
+
+def getBestVideo(query_string, orientation_landscape=True, used_vids=None):
+    """Get the best matching video with improved query handling"""
+    try:
+        vids = search_videos(query_string, orientation_landscape)
+        return select_best_video(vids, orientation_landscape, used_vids)
     except Exception as e:
         logger.error(f"Video search failed for {query_string}: {str(e)}")
         return None
 
-def generate_video_url(timed_video_searches, video_server):
-    """Generate video URLs with proper query handling"""
-    if video_server != "pexel":
-        return []
+def build_segment_queries(search_terms):
+    """Queries to try for one segment, in order of preference"""
+    queries = []
+    if isinstance(search_terms, (list, tuple)) and len(search_terms) >= 3:
+        # Try combination of first 3 keywords
+        combined_query = " ".join(str(kw) for kw in search_terms[:3])
+        queries.append(combined_query)
+        # Add individual keywords as fallback
+        queries.extend(search_terms[:3])
+    else:
+        queries.append(str(search_terms))
+    return queries
+
+def get_prefetch_pool():
+    """Shared pool for searches started ahead of the footage stage"""
+    global _prefetch_pool
+    with _search_cache_lock:
+        if _prefetch_pool is None:
+            _prefetch_pool = ThreadPoolExecutor(max_workers=max(1, PEXELS_SEARCH_CONCURRENCY),
+                                                thread_name_prefix="pexels-prefetch")
+        return _prefetch_pool
+
+def prefetch_segment_searches(search_terms, orientation_landscape=True):
+    """Start the searches for one segment in the background so they are cached
+    by the time generate_video_url asks for them"""
+    def search(query):
+        try:
+            search_videos(query, orientation_landscape)
+        except Exception as e:
+            logger.warning(f"Early search failed for {query}: {str(e)}")
+
+    # Only the combined query: the fallback keywords are searched later, and
+    # only if it finds nothing usable
+    query = build_segment_queries(search_terms)[0]
+    if isinstance(query, str):
+        get_prefetch_pool().submit(search, query)
+
+def prefetch_searches(queries, orientation_landscape=True, cancel_token=None):
+    """Run the distinct searches concurrently. Returns {query: response or None}.
+
+    Searches not yet started when cancel_token is cancelled are skipped.
+    """
+    distinct = list(dict.fromkeys(q for q in queries if isinstance(q, str)))
 
+    def search(query):
+        if cancel_token is not None and cancel_token.cancelled:
+            return None
+        try:
+            return search_videos(query, orientation_landscape)
+        except Exception as e:
+            logger.error(f"Video search failed for {query}: {str(e)}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, PEXELS_SEARCH_CONCURRENCY)) as pool:
+        return dict(zip(distinct, pool.map(search, distinct)))
+
+def select_segment_videos(timed_video_searches, segment_queries, responses, footage_width=None):
+    """Pick one video per segment in segment order, trying each segment's queries in turn.
+
+    Returns (timed video urls, queries reached whose responses are missing).
+    A segment waiting on a missing response picks nothing for now, and
+    later segments go on as if it stays empty.
+    """
     timed_video_urls = []
-    used_video_ids = []
-    
-    for (t1, t2), search_terms in timed_video_searches:
+    used_video_ids = set()
+    missing = []
+
+    for ((t1, t2), _), queries in zip(timed_video_searches, segment_queries):
         url, vid_id = None, None
-        
-        # Create proper search queries
-        queries = []
-        if isinstance(search_terms, (list, tuple)) and len(search_terms) >= 3:
-            # Try combination of first 3 keywords
-            combined_query = " ".join(str(kw) for kw in search_terms[:3])
-            queries.append(combined_query)
-            # Add individual keywords as fallback
-            queries.extend(search_terms[:3])
-        else:
-            queries.append(str(search_terms))
 
         for query in queries:
+            if isinstance(query, str) and query not in responses:
+                missing.append(query)
+                break
             try:
-                result = getBestVideo(query, True, used_video_ids)
+                result = select_best_video(responses.get(query) if isinstance(query, str) else None,
+                                           True, used_video_ids, footage_width)
                 if result:
                     url, vid_id = result
-                    used_video_ids.append(vid_id)
+                    used_video_ids.add(vid_id)
                     break
             except Exception as e:
                 logger.error(f"Query {query} failed: {str(e)}")
                 continue
                 
         timed_video_urls.append([[t1, t2], url if url else None])
-    
-    return timed_video_urls
\ No newline at end of file
+
+    return timed_video_urls, missing
+
+def generate_video_url(timed_video_searches, video_server, footage_width=None, cancel_token=None):
+    """Generate video URLs with proper query handling.
+
+    The combined query of every segment is searched at once; the fallback
+    keywords are then searched, again concurrently, only for segments that
+    found nothing yet, one fallback position per round. Picking videos and
+    removing duplicates happens in segment order, so the result and the
+    searches sent are those of searching one segment at a time.
+    footage_width asks for smaller renditions of the same videos (see
+    pick_rendition).
+    """
+    if video_server != "pexel":
+        return []
+
+    segment_queries = [build_segment_queries(search_terms) for _, search_terms in timed_video_searches]
+    responses = {}
+    while True:
+        timed_video_urls, missing = select_segment_videos(
+            timed_video_searches, segment_queries, responses, footage_width)
+        if not missing:
+            return timed_video_urls
+        responses.update(prefetch_searches(missing, cancel_token=cancel_token))
+        raise_if_cancelled(cancel_token)
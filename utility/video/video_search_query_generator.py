@@ -1,9 +1,12 @@
 import os
 import json
 import re
-import requests
+import threading
 import logging
+from typing import List, NamedTuple
 from utility.retry_utils import retry_api_call, handle_common_errors
+from utility.llm_client import chat, MalformedOutput, SegmentStreamParser
+from utility.tasks.cancellation import raise_if_cancelled
 
 logger = logging.getLogger(__name__)
 
@@ -80,20 +83,100 @@ OUTPUT (JSON ONLY):""",
 الإخراج (JSON فقط):"""
 }
 
+# Ollama constrains generation to this schema, so answers are always a list of
+# [[start, end], [kw1, kw2, kw3]] with numeric times
+SEGMENTS_SCHEMA = {
+    "type": "array",
+    "minItems": 1,
+    "items": {
+        "type": "array",
+        "minItems": 2,
+        "maxItems": 2,
+        "prefixItems": [
+            {"type": "array", "minItems": 2, "maxItems": 2, "prefixItems": [{"type": "number"}, {"type": "number"}]},
+            {"type": "array", "minItems": 3, "maxItems": 3, "items": {"type": "string", "minLength": 1}}
+        ]
+    }
+}
+
+# How keyword answers turned out: valid as generated, repaired locally, or
+# unusable without the old second "fix this JSON" call to the model.
+# reasked and script_reasked count keyword and script answers stopped early
+# with nothing worth keeping, each costing a second Ollama call; they are
+# not answers themselves, so they are left out of responses.
+STRUCTURED_OUTPUT_STATS = {'responses': 0, 'valid': 0, 'repaired': 0, 'would_self_correct': 0,
+                           'reasked': 0, 'script_reasked': 0}
+REASK_OUTCOMES = ('reasked', 'script_reasked')
+_stats_lock = threading.Lock()
+
+
+def count_structured_output(outcome):
+    with _stats_lock:
+        if outcome not in REASK_OUTCOMES:
+            STRUCTURED_OUTPUT_STATS['responses'] += 1
+        STRUCTURED_OUTPUT_STATS[outcome] += 1
+
+
+def structured_output_stats():
+    with _stats_lock:
+        return dict(STRUCTURED_OUTPUT_STATS)
+
+
+class Segment(NamedTuple):
+    """One keyword segment as the schema describes it"""
+    start: float
+    end: float
+    keywords: List[str]
+
+    @classmethod
+    def from_json(cls, item):
+        """Strictly validate one [[start, end], [kw1, kw2, kw3]] item; raises ValueError"""
+        if not (isinstance(item, list) and len(item) == 2
+                and isinstance(item[0], list) and len(item[0]) == 2
+                and isinstance(item[1], list) and len(item[1]) == 3):
+            raise ValueError(f"Segment does not match the schema: {item!r}")
+        start, end = item[0]
+        if not all(isinstance(t, (int, float)) and not isinstance(t, bool) for t in (start, end)):
+            raise ValueError(f"Segment times must be numbers: {item!r}")
+        if end < start:
+            raise ValueError(f"Segment ends before it starts: {item!r}")
+        keywords = [k.strip() for k in item[1] if isinstance(k, str)]
+        if len(keywords) != 3 or not all(keywords):
+            raise ValueError(f"Segment needs three non-empty keywords: {item!r}")
+        return cls(float(start), float(end), keywords)
+
+    def to_list(self):
+        return [[self.start, self.end], list(self.keywords)]
+
+
+def parse_segments(text):
+    """Segments from a schema-conforming answer; raises ValueError otherwise"""
+    parsed = json.loads(text)
+    if not isinstance(parsed, list) or not parsed:
+        raise ValueError("Answer is not a non-empty list")
+    return [Segment.from_json(item) for item in parsed]
+
+
+def is_segment_list(content):
+    """True when the answer matches the schema, the only answers worth caching"""
+    try:
+        parse_segments(content)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
 def extract_segments(text: str):
-    """More robust parsing with numeric conversion"""
-    # FIX: Improved regex for malformed JSON
-    json_pattern = r'(?s)\[(?:\[\[[^]]+\]\])(?:,\s*\[\[[^]]+\]\])*\]'
-    
+    """Lenient parsing for answers that do not match the schema, without asking the model again"""
     # Attempt direct JSON parse first
     try:
         parsed = json.loads(text)
-        if isinstance(parsed, list):
+        if isinstance(parsed, (list, dict)):
             return parsed
     except Exception:
         pass
     
-    # FIX: New strategy - find all [[time,time], [kw,kw,kw]] patterns
+    # Find all [[time,time], [kw,kw,kw]] patterns
     segments = []
     pattern = re.compile(
         r'\[?\s*\[\s*(\d+\.?\d*)\s*,\s*(\d+\.?\d*)\s*\]\s*,\s*\[\s*"([^"]+)"\s*,\s*"([^"]+)"\s*,\s*"([^"]+)"\s*\]\s*\]?',
@@ -107,39 +190,9 @@ def extract_segments(text: str):
             segments.append([[start, end], kws])
         except Exception:
             continue
-    
-    # FIX: Fallback to self-correction only if no segments found
-    if not segments:
-        return self_correct_format(text)
-    
     return segments
 
 
-def self_correct_format(malformed: str):
-    """Use the LLM to re-format broken JSON into the strict array-of-segments format."""
-    prompt = f"""Fix this malformed JSON into the exact format:
-[[[start,end], ["kw1","kw2","kw3"]], ...]
-
-MALFORMED INPUT:
-{malformed}
-
-OUTPUT ONLY THE CORRECTED JSON ARRAY."""
-    payload = {
-        "model": OLLAMA_MODEL,
-        "messages": [{"role": "user", "content": prompt}],
-        "stream": False,
-        "format": "json"
-    }
-    try:
-        resp = requests.post(f"{OLLAMA_HOST}/api/chat", json=payload, timeout=600)
-        resp.raise_for_status()
-        content = resp.json()["message"]["content"]
-        return json.loads(content)
-    except Exception as e:
-        logger.error(f"Format correction failed: {e}")
-        return []
-
-
 def normalize_segments(raw):
     """Handle more varied structures"""
     # FIX: Added support for {'segments': [...]} and similar
@@ -228,8 +281,12 @@ def chunk_captions(captions, max_seg=4.0):
 
 @handle_common_errors
 @retry_api_call(max_retries=3, initial_delay=2, backoff_factor=2)
-def call_AI_api(script, captions, language="en"):
-    """Call the model, parse, normalize, validate, and fallback if needed."""
+def call_AI_api(script, captions, language="en", use_cache=True, on_segment=None, cancel_token=None):
+    """Call the model, parse, normalize, validate, and fallback if needed.
+
+    on_segment(segment) is called for each raw segment as soon as it has
+    streamed in, before the rest of the answer is available.
+    """
     sys_prompt = PROMPTS.get(language, PROMPTS["en"])
     user_payload = f"Script: {script}\nTimed Captions: {json.dumps(captions)}"
     payload = {
@@ -239,39 +296,55 @@ def call_AI_api(script, captions, language="en"):
             {"role":   "user", "content": user_payload}
         ],
         "stream":  False,
-        "format": "json"
+        "format": SEGMENTS_SCHEMA
     }
 
-    # 1) Show the request
-    print("=== API REQUEST ===")
-    print(json.dumps(payload, indent=2))
-
-    # 2) Call Ollama
-    resp = requests.post(f"{OLLAMA_HOST}/api/chat", json=payload, timeout=600)
-    resp.raise_for_status()
-    data = resp.json()
-
-    # 3) Print the raw AI response
-    raw = data.get("message", {}).get("content", "")
-    print("=== API RAW CONTENT ===")
-    print(raw)
+    # 1) Log the request; its duration is measured in external_call_seconds{service="ollama"}
+    logger.debug(f"Keyword request: {json.dumps(payload, ensure_ascii=False)}")
 
-    # 4) Parse → normalize
-    parsed     = extract_segments(raw)
-    print("=== PARSED ===")
-    print(parsed)
+    # 2) Call Ollama, or reuse its answer to the identical request. Segments are
+    #    parsed as they stream in; output that cannot become a segment list is
+    #    abandoned as soon as that is clear. The segments that streamed in
+    #    before that are kept, and only an answer with none is asked for again.
+    parser = SegmentStreamParser(on_segment=on_segment)
+    salvaged = None
+    try:
+        raw = chat(payload, timeout=600, use_cache=use_cache, cacheable=is_segment_list, on_partial=parser.feed,
+                   cancel_token=cancel_token)
+    except MalformedOutput as e:
+        if parser.segments:
+            logger.warning(f"Stopped malformed keyword output early ({e}), keeping its {len(parser.segments)} segments")
+            salvaged = raw = parser.segments
+        else:
+            logger.warning(f"Stopped malformed keyword output early ({e}) with no segments, asking again")
+            count_structured_output('reasked')
+            raw = chat(payload, timeout=600, use_cache=False, cacheable=is_segment_list, cancel_token=cancel_token)
 
-    normalized = normalize_segments(parsed)
-    print("=== NORMALIZED ===")
-    print(normalized)
+    # 3) Log the raw AI response
+    logger.debug(f"Keyword raw content: {raw}")
 
-    # 5) Validate segments strictly
-    final = []
-    for i, seg in enumerate(normalized):
-        try:
-            final.append(validate_segment(seg, i))
-        except Exception as e:
-            logger.warning(f"Skipping invalid segment {i}: {e}")
+    # 4) Validate against the segment model; the schema makes this the normal case
+    normalized = []
+    try:
+        if salvaged is not None:
+            raise ValueError("output was stopped early")
+        final = [segment.to_list() for segment in parse_segments(raw)]
+        count_structured_output('valid')
+    except (ValueError, TypeError) as e:
+        # Repair locally rather than paying for a second LLM call
+        logger.warning(f"Keyword answer does not match the schema ({e}), repairing it")
+        parsed = salvaged if salvaged is not None else extract_segments(raw)
+        count_structured_output('repaired' if parsed else 'would_self_correct')
+        normalized = normalize_segments(parsed) if parsed else []
+        logger.debug(f"Keyword normalized segments: {normalized}")
+
+        # 5) Validate segments leniently
+        final = []
+        for i, seg in enumerate(normalized):
+            try:
+                final.append(validate_segment(seg, i))
+            except Exception as e:
+                logger.warning(f"Skipping invalid segment {i}: {e}")
 
     # 6) Fallback: if none passed validation, use the normalized list as-is
     if not final:
@@ -324,21 +397,25 @@ def ensure_temporal_continuity(segs, total_dur):
 
     return filled
 
-def getVideoSearchQueriesTimed(script, captions, language="en"):
+def getVideoSearchQueriesTimed(script, captions, language="en", use_cache=True, on_segment=None, cancel_token=None):
     """Preprocess captions → call the API → return final segments."""
     caps = preprocess_captions(captions)
     if not caps:
         raise ValueError("Empty or invalid captions data")
 
     try:
-        return call_AI_api(script, caps, language=language)
+        return call_AI_api(script, caps, language=language, use_cache=use_cache, on_segment=on_segment,
+                           cancel_token=cancel_token)
     except Exception as e:
+        raise_if_cancelled(cancel_token)
         logger.warning(f"Primary call failed: {e}. Retrying with caption chunks...")
         merged = []
         for chunk in chunk_captions(caps):
             try:
-                merged.extend(call_AI_api(script, chunk, language=language))
+                merged.extend(call_AI_api(script, chunk, language=language, use_cache=use_cache,
+                                          on_segment=on_segment, cancel_token=cancel_token))
             except Exception as sub_e:
+                raise_if_cancelled(cancel_token)
                 logger.error(f"Chunk retry failed: {sub_e}")
         if not merged:
             raise
@@ -0,0 +1,55 @@
+import os
+import time
+import threading
+import importlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Heavy modules imported in the background after start-up, so the server
+# answers at once and the first task does not pay for them; empty disables
+WARMUP_MODULES = [m.strip() for m in os.getenv("WARMUP_MODULES", "moviepy.editor,edge_tts").split(",") if m.strip()]
+
+_status = {'started_at': None, 'finished_at': None, 'modules': {}}
+_status_lock = threading.Lock()
+
+
+def _import_all(modules):
+    with _status_lock:
+        _status['started_at'] = time.time()
+        _status['finished_at'] = None
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+            result = {'ok': True, 'seconds': round(time.perf_counter() - start, 3)}
+        except Exception as e:
+            logger.error(f"Failed to warm up module '{name}': {str(e)}")
+            result = {'ok': False, 'error': str(e)}
+        with _status_lock:
+            _status['modules'][name] = result
+    with _status_lock:
+        _status['finished_at'] = time.time()
+
+
+def warm_up_imports(modules=None, background=True):
+    """Import heavy modules ahead of the first task, by default those listed in WARMUP_MODULES"""
+    modules = WARMUP_MODULES if modules is None else modules
+    if not modules:
+        return None
+    if not background:
+        _import_all(modules)
+        return None
+    thread = threading.Thread(target=_import_all, args=(modules,), name="import-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def warmup_status():
+    with _status_lock:
+        return {
+            'done': _status['finished_at'] is not None or not WARMUP_MODULES,
+            'started_at': _status['started_at'],
+            'finished_at': _status['finished_at'],
+            'modules': dict(_status['modules'])
+        }